@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Non-interactive mode for cli.py.
+
+Each command is one line of the form `<model> <action> <args...>`, quoted
+like a shell command line:
+
+    department create "Payroll" "Building A, 5th Floor"
+    employee create "Amir" "Accountant" 1
+    employee update 1 "Amir" "Senior Accountant" 1
+    employee delete 1
+    employee list csv
+    database snapshot backups/company-0900.db
+
+The list commands stream to stdout in any format from listing.FORMATS. The
+database commands (snapshot, restore, vacuum) take an online copy of the
+database, or restore one, while other processes keep using it. They only see
+committed data, so they run on their own rather than inside a batch.
+`database backfill` upgrades a database created before rows had a version
+and departments an employee_count column, and recounts the employees of every
+department. Every batch run makes the same upgrade when it creates the tables.
+
+Blank lines and lines starting with # are ignored.
+"""
+import argparse
+import inspect
+import shlex
+import sys
+import time
+from contextlib import nullcontext
+
+from models.__init__ import CONN
+from models.department import Department
+from models.employee import Employee
+from models import snapshot
+from listing import write_listing
+from profiling import profiled
+
+
+class _RolledBack(Exception):
+    pass
+
+
+def _int(value, label):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{label} must be an integer, got {value!r}")
+
+
+def _find(cls, id_):
+    instance = cls.find_by_id(_int(id_, "id"))
+    if instance is None:
+        raise ValueError(f"{cls.__name__} {id_} not found")
+    return instance
+
+
+def create_department(name, location):
+    return Department.create(name, location)
+
+
+def update_department(id_, name, location):
+    department = _find(Department, id_)
+    department.name = name
+    department.location = location
+    department.update()
+    return department
+
+
+def delete_department(id_):
+    department = _find(Department, id_)
+    department.delete()
+    return department
+
+
+def create_employee(name, job_title, department_id):
+    return Employee.create(name, job_title, _int(department_id, "department_id"))
+
+
+def update_employee(id_, name, job_title, department_id):
+    employee = _find(Employee, id_)
+    employee.name = name
+    employee.job_title = job_title
+    employee.department_id = _int(department_id, "department_id")
+    employee.update()
+    return employee
+
+
+def delete_employee(id_):
+    employee = _find(Employee, id_)
+    employee.delete()
+    return employee
+
+
+def list_departments(fmt="repr"):
+    write_listing(Department, Department.iter_rows(), fmt)
+
+
+def list_employees(fmt="repr"):
+    write_listing(Employee, Employee.iter_rows(), fmt)
+
+
+def list_department_employees(id_, fmt="repr"):
+    department = _find(Department, id_)
+    write_listing(Employee, department.employee_rows(), fmt)
+
+
+def _report_progress(remaining, total):
+    done = total - remaining
+    print(f"\r{done}/{total} pages", end="" if remaining else "\n", file=sys.stderr)
+
+
+def snapshot_database(target):
+    snapshot.snapshot(target, progress=_report_progress)
+
+
+def restore_database(source):
+    snapshot.restore(source, progress=_report_progress)
+    for cls in (Department, Employee):
+        cls.all.clear()
+        cls.synced_seq = None
+
+
+def vacuum_database(target):
+    snapshot.vacuum_into(target)
+
+
+def backfill_database():
+    count = Department.backfill_employee_counts()
+    print(f"{count} departments recounted", file=sys.stderr)
+
+
+COMMANDS = {
+    ("department", "create"): create_department,
+    ("department", "update"): update_department,
+    ("department", "delete"): delete_department,
+    ("department", "list"): list_departments,
+    ("department", "employees"): list_department_employees,
+    ("employee", "create"): create_employee,
+    ("employee", "update"): update_employee,
+    ("employee", "delete"): delete_employee,
+    ("employee", "list"): list_employees,
+    ("database", "snapshot"): snapshot_database,
+    ("database", "restore"): restore_database,
+    ("database", "vacuum"): vacuum_database,
+    ("database", "backfill"): backfill_database,
+}
+
+
+def run_command(args):
+    """Run a single tokenized command and return the affected object, if any"""
+    if len(args) < 2 or (args[0], args[1]) not in COMMANDS:
+        raise ValueError(f"Unknown command: {' '.join(args[:2])}")
+    command = COMMANDS[(args[0], args[1])]
+    params = args[2:]
+    signature = inspect.signature(command)
+    try:
+        signature.bind(*params)
+    except TypeError:
+        raise ValueError(f"usage: {args[0]} {args[1]} {' '.join(signature.parameters)}")
+    return command(*params)
+
+
+def run_batch(lines, atomic=False):
+    """Run every command in lines inside one transaction.
+    Return the number of successful commands and a list of (line number, line, error).
+    When atomic is True, any failure rolls back the whole batch."""
+    Department.create_table()
+    Employee.create_table()
+
+    succeeded = 0
+    failures = []
+    try:
+        with CONN.transaction():
+            for number, line in enumerate(lines, start=1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    args = shlex.split(line)
+                    if args[0] == "database":
+                        raise ValueError("database commands can't run inside a batch")
+                    # a command that fails part way leaves none of its writes behind
+                    with CONN.transaction():
+                        run_command(args)
+                    succeeded += 1
+                except Exception as exc:
+                    failures.append((number, line, exc))
+            if atomic and failures:
+                raise _RolledBack()
+    except _RolledBack:
+        succeeded = 0
+    return succeeded, failures
+
+
+def report(succeeded, failures, elapsed, out=sys.stderr):
+    for number, line, exc in failures:
+        print(f"line {number}: {exc} ({line})", file=out)
+    total = succeeded + len(failures)
+    rate = total / elapsed if elapsed else float("inf")
+    print(
+        f"{total} commands in {elapsed:.3f}s ({rate:.0f}/s): " +
+        f"{succeeded} succeeded, {len(failures)} failed",
+        file=out
+    )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Run company database commands without the interactive menu."
+    )
+    parser.add_argument(
+        "--batch", metavar="FILE",
+        help="file with one command per line, or - to read from stdin")
+    parser.add_argument(
+        "--atomic", action="store_true",
+        help="roll back the whole batch if any command fails")
+    parser.add_argument(
+        "--profile", metavar="DIR",
+        help="profile the run, writing cProfile stats to DIR (default: $COMPANY_PROFILE)")
+    parser.add_argument(
+        "command", nargs=argparse.REMAINDER,
+        help="a single command, e.g. employee create Amir Accountant 1")
+    args = parser.parse_args(argv)
+
+    if args.batch == "-":
+        source = nullcontext(sys.stdin)
+    elif args.batch:
+        try:
+            source = open(args.batch)
+        except OSError as exc:
+            parser.error(f"can't open '{args.batch}': {exc.strerror}")
+    elif args.command:
+        source = nullcontext([shlex.join(args.command)])
+    else:
+        parser.error("either --batch FILE or a command is required")
+
+    action = "-".join(args.command[:2]) if args.command else "batch"
+    start = time.perf_counter()
+    with profiled(action, args.profile):
+        if args.command and args.command[0] == "database":
+            try:
+                run_command(args.command)
+                succeeded, failures = 1, []
+            except Exception as exc:
+                succeeded, failures = 0, [(1, shlex.join(args.command), exc)]
+        else:
+            with source as lines:
+                succeeded, failures = run_batch(lines, atomic=args.atomic)
+    report(succeeded, failures, time.perf_counter() - start)
+    return 1 if failures else 0
@@ -1,54 +1,45 @@
+import os
+import sys
+from importlib import import_module
 
-from helpers import (
-    exit_program,
-    list_departments,
-    find_department_by_name,
-    find_department_by_id,
-    create_department,
-    update_department,
-    delete_department,
-    list_employees,
-    find_employee_by_name,
-    find_employee_by_id,
-    create_employee,
-    update_employee,
-    delete_employee,
-    list_department_employees
-)
+# Helper function run for each menu choice. helpers.py (and with it the models
+# and the database connection) is only imported once a choice is made, so the
+# menu shows up without paying for that work.
+ACTIONS = {
+    "0": "exit_program",
+    "1": "list_departments",
+    "2": "find_department_by_name",
+    "3": "find_department_by_id",
+    "4": "create_department",
+    "5": "update_department",
+    "6": "delete_department",
+    "7": "list_employees",
+    "8": "find_employee_by_name",
+    "9": "find_employee_by_id",
+    "10": "create_employee",
+    "11": "update_employee",
+    "12": "delete_employee",
+    "13": "list_department_employees",
+}
 
 
-def main():
+def main(profile_dir=None):
+    profile_dir = profile_dir or os.environ.get("COMPANY_PROFILE")
     while True:
         menu()
-        choice = input("> ")
-        if choice == "0":
-            exit_program()
-        elif choice == "1":
-            list_departments()
-        elif choice == "2":
-            find_department_by_name()
-        elif choice == "3":
-            find_department_by_id()
-        elif choice == "4":
-            create_department()
-        elif choice == "5":
-            update_department()
-        elif choice == "6":
-            delete_department()
-        elif choice == "7":
-            list_employees()
-        elif choice == "8":
-            find_employee_by_name()
-        elif choice == "9":
-            find_employee_by_id()
-        elif choice == "10":
-            create_employee()
-        elif choice == "11":
-            update_employee()
-        elif choice == "12":
-            delete_employee()
-        elif choice == "13":
-            list_department_employees()
+        try:
+            choice = input("> ")
+        except EOFError:
+            return
+        if choice in ACTIONS:
+            helpers = import_module("helpers")
+            action = getattr(helpers, ACTIONS[choice])
+            if profile_dir:
+                from profiling import profiled
+                with profiled(ACTIONS[choice], profile_dir):
+                    action()
+            else:
+                action()
         else:
             print("Invalid choice")
 
@@ -72,4 +63,11 @@ def menu():
 
 
 if __name__ == "__main__":
-    main()
+    argv = sys.argv[1:]
+    if len(argv) == 2 and argv[0] == "--profile":
+        main(profile_dir=argv[1])
+    elif argv:
+        from batch import main as run_batch
+        sys.exit(run_batch(argv))
+    else:
+        main()
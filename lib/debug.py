@@ -23,5 +23,6 @@ def reset_database():
     Employee.create("Hao", "New Hires Coordinator", human_resources.id)
 
 
-reset_database()
-ipdb.set_trace()
+if __name__ == "__main__":
+    reset_database()
+    ipdb.set_trace()
@@ -1,5 +1,6 @@
 from models.department import Department
 from models.employee import Employee
+from listing import write_listing
 
 
 def exit_program():
@@ -10,7 +11,7 @@ def exit_program():
 
 
 def list_departments():
-    pass
+    write_listing(Department, Department.iter_rows())
 
 
 def find_department_by_name():
@@ -36,7 +37,7 @@ def delete_department():
 # You'll implement the employee functions in the lab
 
 def list_employees():
-    pass
+    write_listing(Employee, Employee.iter_rows())
 
 
 def find_employee_by_name():
@@ -60,4 +61,8 @@ def delete_employee():
 
 
 def list_department_employees():
-    pass
\ No newline at end of file
+    id_ = input("Enter the department's id: ")
+    if department := Department.find_by_id(id_):
+        write_listing(Employee, department.employee_rows())
+    else:
+        print(f'Department {id_} not found')
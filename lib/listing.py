@@ -0,0 +1,75 @@
+"""Write model listings straight from a database cursor.
+
+Rows are formatted as they are fetched and written through a large output
+buffer, so listing a big table neither builds a list of objects nor pays for
+one print() call per row.
+"""
+import sys
+from contextlib import nullcontext
+
+FORMATS = ("repr", "table", "csv", "jsonl")
+
+# Bytes buffered before the output is flushed
+BUFFER_SIZE = 1 << 16
+
+# Rows read before the table format fixes its column widths
+TABLE_SAMPLE = 1000
+
+
+def open_output(buffering=BUFFER_SIZE):
+    """Return a block-buffered text stream on stdout, even when stdout is a terminal"""
+    sys.stdout.flush()
+    try:
+        sys.stdout.fileno()
+    except (AttributeError, OSError):
+        # stdout has been replaced, e.g. by a test runner capturing output
+        return nullcontext(sys.stdout)
+    return open(sys.stdout.fileno(), "w", buffering=buffering,
+                encoding=sys.stdout.encoding, closefd=False)
+
+
+def write_listing(cls, rows, fmt="repr", out=None):
+    """Write the rows of model cls to out (buffered stdout by default) in the requested format"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+    if out is None:
+        with open_output() as out:
+            write_listing(cls, rows, fmt, out)
+        return
+
+    if fmt == "repr":
+        row_format = cls.ROW_FORMAT + "\n"
+        out.writelines(row_format.format(*row) for row in rows)
+    elif fmt == "csv":
+        import csv
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(cls.COLUMNS)
+        writer.writerows(rows)
+    elif fmt == "jsonl":
+        import json
+        columns = cls.COLUMNS
+        dumps = json.dumps
+        out.writelines(dumps(dict(zip(columns, row))) + "\n" for row in rows)
+    else:
+        _write_table(cls.COLUMNS, iter(rows), out)
+
+
+def _write_table(columns, rows, out):
+    # Widths come from the first TABLE_SAMPLE rows; longer values later on
+    # simply push their line wider instead of forcing a second pass.
+    sample = []
+    for row in rows:
+        sample.append(row)
+        if len(sample) == TABLE_SAMPLE:
+            break
+    widths = [len(column) for column in columns]
+    for row in sample:
+        widths = [max(width, len(str(value))) for width, value in zip(widths, row)]
+    # the last column is left unpadded to avoid trailing whitespace
+    row_format = "".join(f"{{:<{width}}}  " for width in widths[:-1]) + "{}\n"
+
+    out.write(row_format.format(*columns))
+    out.write(row_format.format(*("-" * width for width in widths)))
+    out.writelines(row_format.format(*map(str, row)) for row in sample)
+    out.writelines(row_format.format(*map(str, row)) for row in rows)
+
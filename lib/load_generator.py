@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Simulate concurrent CLI users against the company database.
+
+    python lib/load_generator.py --seed 50 10000             # reseed the database first
+    python lib/load_generator.py --workers 8 --duration 30 --writes 0.2
+    python lib/load_generator.py --workers 4 --processes --database copy.db
+
+Each worker repeatedly picks an action, a write with probability --writes and
+a read otherwise, and runs it the way the CLI does. The helpers in helpers.py
+prompt for their arguments with input(), so the workers run their
+non-interactive equivalents: listings are written to os.devnull, lookups go
+through the model API and writes through the batch commands. Workers are
+threads sharing the process (and the models' object dictionaries) or, with
+--processes, separate processes.
+
+The report gives the throughput, latency percentiles and SQL statements per
+action, the writes that failed with "database is locked" and the updates that
+lost a version conflict.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+JOB_TITLES = ("Accountant", "Manager", "Benefits Coordinator", "New Hires Coordinator",
+              "Engineer", "Recruiter", "Analyst", "Clerk")
+
+# Latency percentiles reported for each action
+PERCENTILES = (50, 95, 99)
+
+
+class _Worker:
+    """The actions of one simulated user, with the ids they pick from"""
+
+    def __init__(self, rng):
+        from models.__init__ import reader
+        self.rng = rng
+        self.out = open(os.devnull, "w")
+        self.department_ids = [row[0] for row in reader().execute("SELECT id FROM departments")]
+        self.max_employee_id = reader().execute(
+            "SELECT COALESCE(MAX(id), 0) FROM employees").fetchone()[0]
+        self.created = []
+        # (weight, action) by name
+        self.reads = {
+            "list_departments": (5, self.list_departments),
+            "list_employees": (1, self.list_employees),
+            "list_department_employees": (5, self.list_department_employees),
+            "find_department_by_id": (10, self.find_department_by_id),
+            "find_employee_by_id": (10, self.find_employee_by_id),
+            "department_roster": (5, self.department_roster),
+        }
+        self.writes = {
+            "create_employee": (4, self.create_employee),
+            "update_employee": (4, self.update_employee),
+            "delete_employee": (2, self.delete_employee),
+        }
+
+    def pick(self, writes):
+        """Return the name and function of a read or write action chosen by weight"""
+        actions = self.writes if self.rng.random() < writes else self.reads
+        name = self.rng.choices(list(actions), [weight for weight, _ in actions.values()])[0]
+        return name, actions[name][1]
+
+    def department_id(self):
+        return self.rng.choice(self.department_ids)
+
+    def employee_id(self):
+        return self.rng.randint(1, max(self.max_employee_id, 1))
+
+    def list_departments(self):
+        from models.department import Department
+        from listing import write_listing
+        write_listing(Department, Department.iter_rows(), out=self.out)
+
+    def list_employees(self):
+        from models.employee import Employee
+        from listing import write_listing
+        write_listing(Employee, Employee.iter_rows(), out=self.out)
+
+    def list_department_employees(self):
+        from models.department import Department
+        from models.employee import Employee
+        from listing import write_listing
+        if department := Department.find_by_id(self.department_id()):
+            write_listing(Employee, department.employee_rows(), out=self.out)
+
+    def find_department_by_id(self):
+        from models.department import Department
+        Department.find_by_id(self.department_id())
+
+    def find_employee_by_id(self):
+        from models.employee import Employee
+        Employee.find_by_id(self.employee_id())
+
+    def department_roster(self):
+        from models.employee import Employee
+        for employee in Employee.where(department_id=self.department_id()).order_by("name").all():
+            employee.department.name
+
+    def create_employee(self):
+        from batch import run_command
+        employee = run_command(["employee", "create", f"Load {self.rng.getrandbits(48):x}",
+                                self.rng.choice(JOB_TITLES), str(self.department_id())])
+        self.created.append(employee.id)
+
+    def update_employee(self):
+        from models.employee import Employee
+        if employee := Employee.find_by_id(self.employee_id()):
+            employee.job_title = self.rng.choice(JOB_TITLES)
+            employee.update()
+
+    def delete_employee(self):
+        from batch import run_command
+        # only remove the employees this worker added, keeping the seeded rows
+        if self.created:
+            run_command(["employee", "delete", str(self.created.pop())])
+        else:
+            self.create_employee()
+
+
+def run_worker(number, duration, writes, seed=None):
+    """Run random actions for duration seconds and return a dictionary with the
+    latencies, statement counts and errors of each action"""
+    import sqlite3
+    from models.__init__ import StaleObjectError, is_busy, statement_count
+
+    worker = _Worker(random.Random(None if seed is None else seed + number))
+    latencies = defaultdict(list)
+    statements = Counter()
+    errors = Counter()
+    try:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            name, action = worker.pick(writes)
+            before = statement_count()
+            start = time.perf_counter()
+            try:
+                action()
+            except StaleObjectError:
+                errors["version conflicts"] += 1
+            except sqlite3.OperationalError as exc:
+                errors["lock errors" if is_busy(exc) else "other errors"] += 1
+            except Exception:
+                errors["other errors"] += 1
+            latencies[name].append(time.perf_counter() - start)
+            statements[name] += statement_count() - before
+    finally:
+        worker.out.close()
+    return {"latencies": dict(latencies), "statements": statements, "errors": errors}
+
+
+def run(workers, duration, writes, processes=False, seed=None):
+    """Run workers concurrently and return their combined results"""
+    if processes:
+        # spawned, not forked: a forked child would share the parent's connections
+        pool = ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+    else:
+        pool = ThreadPoolExecutor(workers)
+    with pool:
+        results = list(pool.map(run_worker, range(workers), [duration] * workers,
+                                [writes] * workers, [seed] * workers))
+    combined = {"latencies": defaultdict(list), "statements": Counter(), "errors": Counter()}
+    for result in results:
+        for name, values in result["latencies"].items():
+            combined["latencies"][name] += values
+        combined["statements"].update(result["statements"])
+        combined["errors"].update(result["errors"])
+    return combined
+
+
+def percentile(values, p):
+    """Return the nearest-rank p-th percentile of the sorted list values"""
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def report(results, elapsed, workers, out=sys.stdout):
+    latencies = results["latencies"]
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total} actions by {workers} workers in {elapsed:.1f}s "
+          f"({total / elapsed:.0f}/s)", file=out)
+    errors = results["errors"]
+    print(", ".join(f"{errors[kind]} {kind}" for kind in
+                    ("lock errors", "version conflicts", "other errors")), file=out)
+    header = "".join(f"{f'p{p} ms':>9}" for p in PERCENTILES)
+    print(f"{'action':<27}{'count':>8}{header}{'max ms':>9}{'queries':>9}", file=out)
+    for name in sorted(latencies):
+        values = sorted(latencies[name])
+        columns = "".join(f"{percentile(values, p) * 1000:9.2f}" for p in PERCENTILES)
+        queries = results["statements"][name] / len(values)
+        print(f"{name:<27}{len(values):8d}{columns}{values[-1] * 1000:9.2f}{queries:9.1f}",
+              file=out)
+
+
+def seed_database(departments, employees):
+    """Replace the contents of the database with departments departments and
+    employees employees spread evenly between them"""
+    from models.department import Department
+    from models.employee import Employee
+    Employee.drop_table()
+    Department.drop_table()
+    Department.create_table()
+    Employee.create_table()
+    Department.upsert_many(
+        (f"Department {n}", f"Building {n % 10}") for n in range(departments))
+    ids = [department.id for department in Department.get_all()]
+    Employee.upsert_many(
+        (f"Employee {n}", JOB_TITLES[n % len(JOB_TITLES)], ids[n % len(ids)])
+        for n in range(employees))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog="load_generator.py",
+        description="Simulate concurrent CLI users against the company database.")
+    parser.add_argument("--database", help="database file (default: $COMPANY_DB or company.db)")
+    parser.add_argument("--seed", nargs=2, type=int, metavar=("DEPARTMENTS", "EMPLOYEES"),
+                        help="replace the database contents with generated rows first")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent users (default: 4)")
+    parser.add_argument("--processes", action="store_true",
+                        help="run the workers as processes instead of threads")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds to run (default: 10)")
+    parser.add_argument("--writes", type=float, default=0.2,
+                        help="fraction of the actions that write (default: 0.2)")
+    parser.add_argument("--random-seed", type=int, help="make the action sequence repeatable")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        # read by the models when they are imported, here and in worker processes
+        os.environ["COMPANY_DB"] = args.database
+    if args.seed:
+        seed_database(*args.seed)
+
+    start = time.perf_counter()
+    results = run(args.workers, args.duration, args.writes, args.processes, args.random_seed)
+    report(results, time.perf_counter() - start, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Measure the memory held by hydrated employees with and without VALUE_POOL.
+
+    python lib/memory_benchmark.py              # 1,000,000 employees
+    python lib/memory_benchmark.py 100000
+
+The employees are written to a scratch database, then loaded twice with
+Employee.get_all(): once with the pool disabled and once with it enabled.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DIRECTORY = tempfile.mkdtemp(prefix="company-benchmark-")
+os.environ["COMPANY_DB"] = os.path.join(DIRECTORY, "company.db")
+
+from models.__init__ import CONN  # noqa: E402
+from models.department import Department  # noqa: E402
+from models.employee import Employee  # noqa: E402
+from models.model import VALUE_POOL, VALUE_POOL_SIZE  # noqa: E402
+
+JOB_TITLES = ("Accountant", "Manager", "Benefits Coordinator", "New Hires Coordinator",
+              "Engineer", "Recruiter", "Analyst", "Clerk")
+DEPARTMENTS = 50
+
+
+def populate(count):
+    Department.create_table()
+    Employee.create_table()
+    with CONN.transaction():
+        CONN.executemany(
+            "INSERT INTO departments (name, location) VALUES (?, ?)",
+            ((f"Department {n}", f"Building {n % 5}") for n in range(DEPARTMENTS)))
+        CONN.executemany(
+            "INSERT INTO employees (name, job_title, department_id) VALUES (?, ?, ?)",
+            ((f"Employee {n}", JOB_TITLES[n % len(JOB_TITLES)], n % DEPARTMENTS + 1)
+             for n in range(count)))
+
+
+def measure(limit):
+    """Load every employee with a pool of at most limit values and return
+    (seconds, bytes held by the loaded objects)"""
+    Employee.all = {}
+    VALUE_POOL.clear()
+    VALUE_POOL.limit = limit
+    tracemalloc.start()
+    start = time.perf_counter()
+    employees = Employee.get_all()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del employees
+    return elapsed, size
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    populate(count)
+    results = {"without pool": measure(0), "with pool": measure(VALUE_POOL_SIZE)}
+    for label, (elapsed, size) in results.items():
+        print(f"{label:>12}: {size / 2 ** 20:8.1f} MiB, loaded in {elapsed:.2f}s")
+    saved = results["without pool"][1] - results["with pool"][1]
+    print(f"{saved / 2 ** 20:.1f} MiB saved ({saved / count:.0f} bytes per employee)")
+    shutil.rmtree(DIRECTORY)
@@ -1,4 +1,316 @@
+import os
+import pathlib
+import random
 import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
 
-CONN = sqlite3.connect('company.db')
-CURSOR = CONN.cursor()
+# Database file, overridable so scripts and workers can point at another copy
+DATABASE = os.environ.get("COMPANY_DB", "company.db")
+
+# Seconds a statement waits on another connection's lock before failing
+BUSY_TIMEOUT = float(os.environ.get("COMPANY_DB_BUSY_TIMEOUT", 5.0))
+
+# Retries of a write that still failed with "database is locked", and the base
+# delay in seconds of the exponential, jittered backoff between them
+WRITE_RETRIES = int(os.environ.get("COMPANY_DB_WRITE_RETRIES", 5))
+RETRY_DELAY = float(os.environ.get("COMPANY_DB_RETRY_DELAY", 0.05))
+
+# Serve the query methods from read-only connections, so that long reads never
+# hold the connection writes go through. COMPANY_DB_SPLIT_READS=0 reads through CONN.
+SPLIT_READS = os.environ.get("COMPANY_DB_SPLIT_READS", "1") != "0"
+
+# Row id and row count of a committed write
+WriteResult = namedtuple("WriteResult", ["lastrowid", "rowcount"])
+
+
+class Cursor(sqlite3.Cursor):
+    """sqlite3 cursor counting the statements it runs in its connection's statements"""
+
+    def execute(self, sql, parameters=()):
+        self.connection.statements += 1
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.statements += 1
+        return super().executemany(sql, seq_of_parameters)
+
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection whose commits can be grouped with transaction(), and
+    which counts the statements run through it (see statement_count())"""
+
+    depth = 0
+    statements = 0
+    # Functions registered with after_commit() in the open transaction() block
+    _pending = ()
+
+    def cursor(self, factory=Cursor):
+        return super().cursor(factory)
+
+    # sqlite3's shortcuts run the statement without calling the cursor's
+    # methods, so they go through a Cursor to be counted
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        """Commit, unless a transaction() block is open on this connection"""
+        if not self.depth:
+            super().commit()
+
+    @contextmanager
+    def transaction(self):
+        """Defer every commit issued inside the block to a single commit at its end.
+        The whole block is rolled back if it raises. A block nested in another
+        one runs in a savepoint: if it raises, only its own changes are undone."""
+        if self.depth:
+            yield from self._savepoint()
+            return
+        self.depth += 1
+        self._pending = []
+        try:
+            yield self
+        except BaseException:
+            self.depth -= 1
+            self._pending = ()
+            self.rollback()
+            raise
+        self.depth -= 1
+        self.commit()
+        pending, self._pending = self._pending, ()
+        for func in pending:
+            func()
+
+    def after_commit(self, func):
+        """Call func() once the changes made so far are committed: at the end of
+        the outermost transaction() block, or at once outside one. It is not
+        called if the block it was registered in is rolled back."""
+        if not self.depth:
+            return func()
+        self._pending.append(func)
+
+    def _savepoint(self):
+        # Releasing a savepoint opened outside BEGIN would commit, so make sure
+        # the enclosing transaction has started
+        if not self.in_transaction:
+            self.execute("BEGIN")
+        name = f"transaction_{self.depth}"
+        self.execute(f"SAVEPOINT {name}")
+        self.depth += 1
+        pending = len(self._pending)
+        try:
+            yield self
+        except BaseException:
+            self.depth -= 1
+            del self._pending[pending:]
+            # some errors already roll the whole transaction back
+            if self.in_transaction:
+                self.execute(f"ROLLBACK TO {name}")
+                self.execute(f"RELEASE {name}")
+            raise
+        self.depth -= 1
+        self.execute(f"RELEASE {name}")
+
+
+class StaleObjectError(Exception):
+    """Raised by update() when the row was changed or deleted by another
+    connection after the object was read"""
+
+
+def update_with_refresh(instance, change, attempts=3):
+    """Apply change(instance) and update the instance's row. On a version conflict,
+    reload the instance from the database and apply the change again."""
+    for attempt in range(attempts):
+        change(instance)
+        try:
+            instance.update()
+            return instance
+        except StaleObjectError:
+            if attempt == attempts - 1:
+                raise
+            instance.refresh()
+
+
+def connect(database=None):
+    """Open a new connection to the company database, with the employee shards attached if enabled"""
+    from models import shards
+    database = database or DATABASE
+    conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT, factory=Connection)
+    conn.execute("PRAGMA foreign_keys = ON")
+    if shards.SHARDS:
+        shards.attach(conn, database)
+    # in WAL mode readers see the last commit while a write is in progress,
+    # instead of waiting for it. The shards keep a rollback journal: in WAL
+    # mode a transaction writing to several files is only atomic per file, so
+    # a crash while an employee moves between shards could duplicate or lose it.
+    conn.execute("PRAGMA main.journal_mode = WAL")
+    for shard in range(shards.SHARDS):
+        conn.execute(f"PRAGMA shard{shard}.journal_mode = DELETE")
+    upgrade_schema(conn, database)
+    return conn
+
+
+def connect_reader(database=None):
+    """Open a read-only connection to the company database, with the employee shards attached if enabled"""
+    from models import shards
+    database = database or DATABASE
+    if any((database, upgrade) not in _UPGRADED for upgrade in SCHEMA_UPGRADES):
+        # a read-only connection can't upgrade the tables it reads
+        connect(database).close()
+    uri = pathlib.Path(database).absolute().as_uri() + "?mode=ro"
+    # autocommit, so that no statement leaves a transaction pinning an old snapshot
+    conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT, factory=Connection,
+                           isolation_level=None)
+    if shards.SHARDS:
+        shards.attach(conn, database)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+# Functions called with a connection to bring the tables of a database created
+# by an earlier version of the models up to date (see Model.upgrade_table())
+SCHEMA_UPGRADES = []
+
+# (database, upgrade) pairs already run by this process
+_UPGRADED = set()
+_UPGRADE_LOCK = threading.Lock()
+
+
+def upgrade_schema(conn, database):
+    """Run the SCHEMA_UPGRADES not yet run on database by this process through
+    conn, so that a database created before a column existed can be read"""
+    with _UPGRADE_LOCK:
+        upgrades = [upgrade for upgrade in SCHEMA_UPGRADES
+                    if (database, upgrade) not in _UPGRADED]
+        for upgrade in upgrades:
+            upgrade(conn)
+        conn.commit()
+        _UPGRADED.update((database, upgrade) for upgrade in upgrades)
+
+
+class _PerThread:
+    """Proxy to an object created by factory the first time each thread uses it.
+    sqlite3 connections can't be shared between threads, so every thread gets
+    its own connection (and cursor) to the same database."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+
+    def _target(self):
+        try:
+            return self._local.target
+        except AttributeError:
+            self._local.target = self._factory()
+            return self._local.target
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._target(), name, value)
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __enter__(self):
+        return self._target().__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._target().__exit__(*exc_info)
+
+
+CONN = _PerThread(connect)
+CURSOR = _PerThread(lambda: CONN.cursor())
+READER = _PerThread(connect_reader)
+
+
+def reader():
+    """Return the connection the query methods read through: the thread's
+    read-only connection, or CONN while it has a transaction open, as only
+    CONN sees the changes made in it"""
+    if not SPLIT_READS or CONN.depth or CONN.in_transaction:
+        return CONN
+    return READER
+
+
+def set_trace_callback(callback):
+    """Call callback with the text of every statement this thread runs, on
+    either of its connections. None removes the callback."""
+    CONN.set_trace_callback(callback)
+    READER.set_trace_callback(callback)
+
+
+def statement_count():
+    """Return the number of statements this thread has run on either of its
+    connections, counting each execute() and executemany() call once. The
+    statements run by triggers, and the BEGIN and COMMIT sqlite3 issues
+    itself, are not counted."""
+    return CONN.statements + READER.statements
+
+
+def is_busy(exc):
+    """Return True if exc means another connection holds the database lock"""
+    message = str(exc)
+    return (isinstance(exc, sqlite3.OperationalError) and
+            ("locked" in message or "busy" in message))
+
+
+def backoff(attempt):
+    """Seconds to wait before retry number attempt: exponential with full jitter,
+    so writers that collided don't all retry at the same moment"""
+    return random.uniform(0, RETRY_DELAY * 2 ** attempt)
+
+
+def with_retry(conn, func):
+    """Return func(), rolling back conn and retrying with backoff while the database is busy.
+    Inside a transaction() block the error is raised, as only the whole block can be retried."""
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            return func()
+        except sqlite3.OperationalError as exc:
+            if not is_busy(exc) or conn.depth or attempt == WRITE_RETRIES:
+                raise
+            conn.rollback()
+            time.sleep(backoff(attempt))
+
+
+# WriteQueue running model writes when enabled with enable_write_queue()
+WRITE_QUEUE = None
+
+
+def enable_write_queue(max_batch=500):
+    """Send model writes from every thread through a single writer thread"""
+    global WRITE_QUEUE
+    from models.write_queue import WriteQueue
+    if WRITE_QUEUE is None:
+        WRITE_QUEUE = WriteQueue(max_batch=max_batch)
+    return WRITE_QUEUE
+
+
+def disable_write_queue():
+    """Finish the queued writes, stop the writer thread and write directly again"""
+    global WRITE_QUEUE
+    if WRITE_QUEUE is not None:
+        WRITE_QUEUE.close()
+        WRITE_QUEUE = None
+
+
+def write(sql, params=()):
+    """Run a write statement, commit it and return its WriteResult"""
+    if WRITE_QUEUE is not None and not CONN.depth:
+        return WRITE_QUEUE.execute(sql, params)
+
+    def execute():
+        CURSOR.execute(sql, params)
+        CONN.commit()
+        return WriteResult(CURSOR.lastrowid, CURSOR.rowcount)
+    return with_retry(CONN, execute)
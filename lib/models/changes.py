@@ -0,0 +1,86 @@
+# lib/models/changes.py
+from models.__init__ import CURSOR, CONN, reader
+
+# Changes kept in the log; older ones are deleted as new ones are recorded.
+# A reader that falls further behind reloads its table in full.
+CHANGE_LOG_ROWS = 100000
+
+
+def create_change_log():
+    """ Create the table, filled by triggers on the model tables, recording every row change """
+    sql = """
+        CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL,
+        row_id INTEGER NOT NULL)
+    """
+    CURSOR.execute(sql)
+    CURSOR.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS changes_prune
+        AFTER INSERT ON changes
+        BEGIN
+            DELETE FROM changes WHERE seq <= NEW.seq - {CHANGE_LOG_ROWS};
+        END
+    """)
+    CONN.commit()
+
+
+def change_triggers(table):
+    """Return the statements creating the triggers that log the changes to table"""
+    return [
+        f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{op}_log
+            AFTER {op.upper()} ON {table}
+            BEGIN
+                INSERT INTO changes (table_name, op, row_id)
+                VALUES ('{table}', '{op}', {row}.id);
+            END
+        """
+        for op, row in (("insert", "NEW"), ("update", "NEW"), ("delete", "OLD"))
+    ]
+
+
+def latest_seq():
+    """Return the sequence number of the latest change, 0 if there is none.
+    Pruning the log doesn't lower it."""
+    sql = """
+        SELECT COALESCE(MAX(seq), 0)
+        FROM sqlite_sequence
+        WHERE name = 'changes'
+    """
+    return reader().execute(sql).fetchone()[0]
+
+
+def pruned_seq():
+    """Return the sequence number of the latest change deleted from the log:
+    changes_since() only returns every change after seq if seq is at least this"""
+    sql = """
+        SELECT MIN(seq) - 1
+        FROM changes
+    """
+    seq = reader().execute(sql).fetchone()[0]
+    return latest_seq() if seq is None else seq
+
+
+def changes_since(seq, table=None, until=None):
+    """Return (seq, table name, op, row id) for each change after seq, oldest first.
+    Optionally restrict the changes to one table, and to those up to sequence number until."""
+    sql = """
+        SELECT seq, table_name, op, row_id
+        FROM changes
+        WHERE seq > ? AND (? IS NULL OR table_name = ?) AND (? IS NULL OR seq <= ?)
+        ORDER BY seq
+    """
+    return reader().execute(sql, (seq, table, table, until, until)).fetchall()
+
+
+def prune_changes(seq):
+    """Delete the changes up to and including seq. A reader that hadn't applied
+    them yet reloads its table in full (see Model.refresh_incremental())."""
+    sql = """
+        DELETE FROM changes
+        WHERE seq <= ?
+    """
+    CURSOR.execute(sql, (seq,))
+    CONN.commit()
@@ -1,19 +1,33 @@
 # lib/models/department.py
-from models.__init__ import CURSOR, CONN
+from models.__init__ import CURSOR, CONN, reader
+from models.model import Model
 
 
-class Department:
+class Department(Model):
 
-    # Dictionary of objects saved to the database.
-    all = {}
+    TABLE = "departments"
+    FIELDS = (("name", "TEXT"), ("location", "TEXT"))
+    INTERNED = ("location",)
+    NATURAL_KEY = ("name",)
+    # Kept up to date by triggers on the employees table (see Employee.create_table)
+    COMPUTED_FIELDS = (("employee_count", "INTEGER NOT NULL DEFAULT 0"),)
+
+    # Set employee_count to the number of employees of each department
+    RECOUNT_SQL = """
+        UPDATE departments
+        SET employee_count = (
+            SELECT COUNT(*) FROM employees WHERE department_id = departments.id)
+    """
+
+    # The repr of a row, also used by listings
+    ROW_FORMAT = "<Department {}: {}, {}>"
 
     def __init__(self, name, location, id=None):
         self.id = id
+        self.version = None
         self.name = name
         self.location = location
-
-    def __repr__(self):
-        return f"<Department {self.id}: {self.name}, {self.location}>"
+        self._employee_count = 0
 
     @property
     def name(self):
@@ -41,140 +55,72 @@ class Department:
                 "Location must be a non-empty string"
             )
 
-    @classmethod
-    def create_table(cls):
-        """ Create a new table to persist the attributes of Department instances """
-        sql = """
-            CREATE TABLE IF NOT EXISTS departments (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            location TEXT)
-        """
-        CURSOR.execute(sql)
-        CONN.commit()
+    @property
+    def employee_count(self):
+        """Number of employees in the department when it was last read"""
+        return self._employee_count
 
     @classmethod
-    def drop_table(cls):
-        """ Drop the table that persists Department instances """
-        sql = """
-            DROP TABLE IF EXISTS departments;
-        """
-        CURSOR.execute(sql)
-        CONN.commit()
-
-    def save(self):
-        """ Insert a new row with the name and location values of the current Department instance.
-        Update object id attribute using the primary key value of new row.
-        Save the object in local dictionary using table row's PK as dictionary key"""
-        sql = """
-            INSERT INTO departments (name, location)
-            VALUES (?, ?)
-        """
-
-        CURSOR.execute(sql, (self.name, self.location))
-        CONN.commit()
-
-        self.id = CURSOR.lastrowid
-        type(self).all[self.id] = self
+    def upgrade_table(cls, conn=CONN):
+        """Bring the departments table up to date through conn, counting the
+        employees of each department when employee_count is added"""
+        added = super().upgrade_table(conn)
+        if added and "employee_count" in added and conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'employees'"
+        ).fetchone():
+            # databases created before the counts never had shards
+            conn.execute(cls.RECOUNT_SQL.replace("FROM employees", "FROM main.employees"))
+        return added
 
     @classmethod
-    def create(cls, name, location):
-        """ Initialize a new Department instance and save the object to the database """
-        department = cls(name, location)
-        department.save()
-        return department
-
-    def update(self):
-        """Update the table row corresponding to the current Department instance."""
-        sql = """
-            UPDATE departments
-            SET name = ?, location = ?
-            WHERE id = ?
-        """
-        CURSOR.execute(sql, (self.name, self.location, self.id))
-        CONN.commit()
-
-    def delete(self):
+    def backfill_employee_counts(cls):
+        """Upgrade the tables of a database created before departments had an
+        employee count (see upgrade_table()), and recount the employees of
+        every department. Return the number of departments updated."""
+        from models.employee import Employee
+        with CONN.transaction():
+            cls.upgrade_table()
+            Employee.upgrade_table()
+            rowcount = CURSOR.execute(cls.RECOUNT_SQL).rowcount
+        for department in cls.all.values():
+            department.refresh()
+        return rowcount
+
+    def delete(self, cascade=True):
         """Delete the table row corresponding to the current Department instance,
-        delete the dictionary entry, and reassign id attribute"""
-
-        sql = """
-            DELETE FROM departments
-            WHERE id = ?
-        """
-
-        CURSOR.execute(sql, (self.id,))
-        CONN.commit()
-
-        # Delete the dictionary entry using id as the key
-        del type(self).all[self.id]
-
-        # Set the id to None
-        self.id = None
-
-    @classmethod
-    def instance_from_db(cls, row):
-        """Return a Department object having the attribute values from the table row."""
-
-        # Check the dictionary for an existing instance using the row's primary key
-        department = cls.all.get(row[0])
-        if department:
-            # ensure attributes match row values in case local instance was modified
-            department.name = row[1]
-            department.location = row[2]
-        else:
-            # not in dictionary, create new instance and add to dictionary
-            department = cls(row[1], row[2])
-            department.id = row[0]
-            cls.all[department.id] = department
-        return department
-
-    @classmethod
-    def get_all(cls):
-        """Return a list containing a Department object per row in the table"""
-        sql = """
-            SELECT *
-            FROM departments
-        """
-
-        rows = CURSOR.execute(sql).fetchall()
-
-        return [cls.instance_from_db(row) for row in rows]
-
-    @classmethod
-    def find_by_id(cls, id):
-        """Return a Department object corresponding to the table row matching the specified primary key"""
-        sql = """
-            SELECT *
-            FROM departments
-            WHERE id = ?
-        """
-
-        row = CURSOR.execute(sql, (id,)).fetchone()
-        return cls.instance_from_db(row) if row else None
-
-    @classmethod
-    def find_by_name(cls, name):
-        """Return a Department object corresponding to first table row matching specified name"""
-        sql = """
-            SELECT *
-            FROM departments
-            WHERE name is ?
-        """
-
-        row = CURSOR.execute(sql, (name,)).fetchone()
-        return cls.instance_from_db(row) if row else None
+        along with the rows of its employees, in one transaction. When cascade
+        is another Department, the employees are moved to it instead; when it
+        is False, ValueError is raised if the department has employees.
+        The employees affected are removed from Employee.all."""
+        from models.employee import Employee
+        department_id = self.id
+        with CONN.transaction():
+            if Employee.table_exists(department_id):
+                if isinstance(cascade, Department):
+                    Employee.move_department(department_id, cascade.id)
+                elif cascade:
+                    Employee.delete_department(department_id)
+                elif self.employee_rows().fetchone():
+                    raise ValueError(f"Department {department_id} still has employees")
+            super().delete()
+        Employee.evict_department(department_id)
 
     def employees(self):
         """Return list of employees associated with current department"""
         from models.employee import Employee
-        sql = """
-            SELECT * FROM employees
+        sql = Employee.SELECT_SQL.replace(
+            "FROM employees", f"FROM {Employee.table_for(self.id)}") + "WHERE department_id = ?"
+        rows = reader().execute(sql, (self.id,),).fetchall()
+        return Employee.loaded_together([
+            Employee.instance_from_db(row) for row in rows
+        ])
+
+    def employee_rows(self):
+        """Return a cursor streaming the employee rows of the current department"""
+        from models.employee import Employee
+        sql = f"""
+            SELECT {", ".join(Employee.COLUMNS)}
+            FROM {Employee.table_for(self.id)}
             WHERE department_id = ?
         """
-        CURSOR.execute(sql, (self.id,),)
-
-        rows = CURSOR.fetchall()
-        return [
-            Employee.instance_from_db(row) for row in rows
-        ]
+        return reader().cursor().execute(sql, (self.id,))
@@ -1,25 +1,74 @@
 # lib/models/employee.py
-from models.__init__ import CURSOR, CONN
+from models.__init__ import CURSOR, CONN, StaleObjectError, reader, write
+from models.model import Model
 from models.department import Department
+from models import shards
 
 
-class Employee:
+class Employee(Model):
 
-    # Dictionary of objects saved to the database.
-    all = {}
+    TABLE = "employees"
+    FIELDS = (
+        ("name", "TEXT"),
+        ("job_title", "TEXT"),
+        ("department_id", "INTEGER REFERENCES departments(id) ON DELETE CASCADE"),
+    )
+    INTERNED = ("job_title",)
+    NATURAL_KEY = ("name", "department_id")
+
+    # The repr of a row, also used by listings
+    ROW_FORMAT = "<Employee {}: {}, {}, Department ID: {}>"
+
+    # Keep departments.employee_count up to date as employees are added,
+    # moved and removed
+    COUNT_TRIGGERS_SQL = [
+        """
+            CREATE TRIGGER IF NOT EXISTS employees_insert_count
+            AFTER INSERT ON employees
+            BEGIN
+                UPDATE departments SET employee_count = employee_count + 1
+                WHERE id = NEW.department_id;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS employees_update_count
+            AFTER UPDATE OF department_id ON employees
+            WHEN OLD.department_id IS NOT NEW.department_id
+            BEGIN
+                UPDATE departments SET employee_count = employee_count - 1
+                WHERE id = OLD.department_id;
+                UPDATE departments SET employee_count = employee_count + 1
+                WHERE id = NEW.department_id;
+            END
+        """,
+        """
+            CREATE TRIGGER IF NOT EXISTS employees_delete_count
+            AFTER DELETE ON employees
+            BEGIN
+                UPDATE departments SET employee_count = employee_count - 1
+                WHERE id = OLD.department_id;
+            END
+        """,
+    ]
+
+    # Find the employees of a department without scanning the table; schema
+    # is "" or the "shardN." prefix of a shard's copy of the table
+    CREATE_INDEX_SQL = """
+        CREATE INDEX IF NOT EXISTS {schema}employees_department_id
+        ON employees (department_id)
+    """
+
+    # The list of employees this one was read with by get_all(), a query's
+    # all() or Department.employees(), whose departments are loaded together
+    _loaded_with = None
 
     def __init__(self, name, job_title, department_id, id=None):
         self.id = id
+        self.version = None
         self.name = name
         self.job_title = job_title
         self.department_id = department_id
 
-    def __repr__(self):
-        return (
-            f"<Employee {self.id}: {self.name}, {self.job_title}, " +
-            f"Department ID: {self.department_id}>"
-        )
-
     @property
     def name(self):
         return self._name
@@ -58,130 +107,301 @@ class Employee:
             raise ValueError(
                 "department_id must reference a department in the database")
 
+    @property
+    def department(self):
+        """Return the Department object the employee belongs to. When it is not
+        loaded yet, the departments of all the employees read together with
+        this one are loaded in the same query."""
+        department = Department.all.get(self.department_id)
+        if department is None:
+            employees = self._loaded_with or (self,)
+            Department.find_by_ids(employee.department_id for employee in employees)
+            department = Department.all.get(self.department_id)
+        return department
+
+    @classmethod
+    def loaded_together(cls, employees):
+        """Mark the employees in a list as read together, so that accessing the
+        department of any of them loads the departments of them all"""
+        for employee in employees:
+            employee._loaded_with = employees
+        return employees
+
+    @classmethod
+    def table_exists(cls, department_id):
+        """Return True if the table holding the employees of a department has been created"""
+        schema, _, name = cls.table_for(department_id).rpartition(".")
+        sql = f"""
+            SELECT 1
+            FROM {schema or "main"}.sqlite_master
+            WHERE type = 'table' AND name = ?
+        """
+        return CURSOR.execute(sql, (name,)).fetchone() is not None
+
+    @classmethod
+    def delete_department(cls, department_id):
+        """Delete the rows of every employee of a department with one statement.
+        Return the number of rows deleted."""
+        rowcount = write(f"""
+            DELETE FROM {cls.table_for(department_id)}
+            WHERE department_id = ?
+        """, (department_id,)).rowcount
+        if shards.SHARDS:
+            cls._count(department_id, -rowcount)
+        return rowcount
+
+    @classmethod
+    def move_department(cls, department_id, target_id):
+        """Move every employee of a department to department target_id with one
+        statement per table. Return the number of employees moved."""
+        source, target = cls.table_for(department_id), cls.table_for(target_id)
+        with CONN.transaction():
+            if source == target:
+                rowcount = write(f"""
+                    UPDATE {source}
+                    SET department_id = ?, version = version + 1
+                    WHERE department_id = ?
+                """, (target_id, department_id)).rowcount
+            else:
+                names = cls.COLUMNS[1:]
+                columns = ", ".join(names)
+                values = ", ".join("?" if name == "department_id" else name for name in names)
+                rowcount = write(f"""
+                    INSERT INTO {target} (id, {columns}, version)
+                    SELECT id, {values}, version + 1
+                    FROM {source}
+                    WHERE department_id = ?
+                """, (target_id, department_id)).rowcount
+                write(f"DELETE FROM {source} WHERE department_id = ?", (department_id,))
+            if shards.SHARDS:
+                cls._count(department_id, -rowcount)
+                cls._count(target_id, rowcount)
+        return rowcount
+
+    @classmethod
+    def evict_department(cls, department_id):
+        """Remove the employees of a department from the dictionary of saved objects.
+        The dictionary is changed in place, as other threads may be adding to it."""
+        for id_, employee in list(cls.all.items()):
+            if employee.department_id == department_id:
+                cls.all.pop(id_, None)
+
+    # With COMPANY_DB_SHARDS set, rows are stored in the shard of their
+    # department (see shards.py). Reads go through the employees view over all
+    # shards; the methods below route writes and lookups to a single shard.
+
+    @classmethod
+    def table_for(cls, department_id):
+        """Return the table holding the employees of a department"""
+        return shards.table(shards.shard_for(department_id)) if shards.SHARDS else cls.TABLE
+
     @classmethod
     def create_table(cls):
         """ Create a new table to persist the attributes of Employee instances """
+        if not shards.SHARDS:
+            super().create_table()
+            CURSOR.execute(cls.CREATE_INDEX_SQL.format(schema=""))
+            CONN.commit()
+            return
+        for shard in range(shards.SHARDS):
+            CURSOR.execute(shards.create_table_sql(cls, shard))
+            CURSOR.execute(cls.CREATE_INDEX_SQL.format(schema=f"shard{shard}."))
+        CONN.commit()
+
+    @classmethod
+    def upsert_many(cls, records, key=None):
+        """Insert or update one employee per record (see Model.upsert_many()).
+        With shards, the key must include department_id, so that an update
+        never moves an employee to another shard."""
+        if shards.SHARDS and "department_id" not in (key or cls.NATURAL_KEY):
+            raise ValueError("With shards, the key to upsert on must include department_id")
+        return super().upsert_many(records, key)
+
+    @classmethod
+    def check_records(cls, records):
+        """Return the records as a list of tuples, raising ValueError for the
+        first one the property setters reject. The departments are read
+        together rather than once per record."""
+        records = [tuple(record) for record in records]
+        departments = Department.find_by_ids(
+            record[2] for record in records if len(record) == 3 and type(record[2]) is int)
+        for name, job_title, department_id in records:
+            employee = cls.__new__(cls)
+            employee.name = name
+            employee.job_title = job_title
+            if department_id not in departments:
+                raise ValueError(
+                    "department_id must reference a department in the database")
+        return records
+
+    @classmethod
+    def _insert_many(cls, records):
+        if not shards.SHARDS:
+            return super()._insert_many(records)
+        for shard, group in cls._by_shard(records).items():
+            CURSOR.executemany(shards.insert_sql(cls, shard), group)
+            # the key includes the department, so only inserts change the
+            # counts; recount the departments written to (see _count())
+            department_ids = list({record[2] for record in group})
+            CONN.after_commit(lambda shard=shard, department_ids=department_ids: write(f"""
+                UPDATE departments
+                SET employee_count = (
+                    SELECT COUNT(*) FROM {shards.table(shard)}
+                    WHERE department_id = departments.id)
+                WHERE id IN ({", ".join("?" * len(department_ids))})
+            """, department_ids))
+
+    @classmethod
+    def _update_many(cls, records):
+        if not shards.SHARDS:
+            return super()._update_many(records)
+        return sum(CURSOR.executemany(shards.update_sql(cls, shard), group).rowcount
+                   for shard, group in cls._by_shard(records).items())
+
+    @staticmethod
+    def _by_shard(records):
+        # the records grouped by the shard of their department
+        groups = {}
+        for record in records:
+            groups.setdefault(shards.shard_for(record[2]), []).append(record)
+        return groups
+
+    @classmethod
+    def upgrade_table(cls, conn=CONN):
+        """Bring the employees table up to date through conn, creating the
+        triggers maintaining the employee count of departments. The shards
+        were created along with the current columns, so they are left as they are."""
+        if shards.SHARDS:
+            return []
+        added = super().upgrade_table(conn)
+        if added is not None and cls.create_count_triggers(conn) and conn.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {cls.TABLE})").fetchone()[0]:
+            # employees added before the triggers existed haven't been counted
+            conn.execute(Department.RECOUNT_SQL)
+        return added
+
+    @classmethod
+    def create_count_triggers(cls, conn=CONN):
+        """Create the triggers maintaining the employee count of departments,
+        and return True if they did not exist yet.
+        A trigger can't update a table in another database file, so with shards
+        the writes below update the counts themselves."""
+        if shards.SHARDS:
+            return False
         sql = """
-            CREATE TABLE IF NOT EXISTS employees (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            job_title TEXT,
-            department_id INTEGER,
-            FOREIGN KEY (department_id) REFERENCES departments(id))
+            SELECT 1
+            FROM sqlite_master
+            WHERE type = 'trigger' AND name = 'employees_insert_count'
         """
-        CURSOR.execute(sql)
-        CONN.commit()
+        created = conn.execute(sql).fetchone() is None
+        Department.add_missing_columns(conn)
+        for sql in cls.COUNT_TRIGGERS_SQL:
+            conn.execute(sql)
+        return created
+
+    @staticmethod
+    def _count(department_id, delta):
+        # Departments are in the main database: updating a count in the
+        # transaction writing to a shard would hold the main database's lock
+        # along with the shard's, and writers to different shards would wait
+        # for each other again. The count is updated once the shard's write
+        # has committed instead, so a crash in between leaves it off until
+        # Department.backfill_employee_counts() recounts.
+        sql = """
+            UPDATE departments
+            SET employee_count = employee_count + ?
+            WHERE id = ?
+        """
+        CONN.after_commit(lambda: write(sql, (delta, department_id)))
 
     @classmethod
     def drop_table(cls):
         """ Drop the table that persists Employee instances """
-        sql = """
-            DROP TABLE IF EXISTS employees;
-        """
-        CURSOR.execute(sql)
+        if not shards.SHARDS:
+            return super().drop_table()
+        for shard in range(shards.SHARDS):
+            CURSOR.execute(f"DROP TABLE IF EXISTS {shards.table(shard)}")
         CONN.commit()
 
     def save(self):
         """ Insert a new row with the name, job title, and department id values of the current Employee object.
         Update object id attribute using the primary key value of new row.
         Save the object in local dictionary using table row's PK as dictionary key"""
-        sql = """
-                INSERT INTO employees (name, job_title, department_id)
-                VALUES (?, ?, ?)
-        """
-
-        CURSOR.execute(sql, (self.name, self.job_title, self.department_id))
-        CONN.commit()
-
-        self.id = CURSOR.lastrowid
+        if not shards.SHARDS:
+            return super().save()
+        shard = shards.shard_for(self.department_id)
+        with CONN.transaction():
+            self.id = write(shards.insert_sql(type(self), shard), self.values()).lastrowid
+            self._count(self.department_id, 1)
+        self.version = 1
         type(self).all[self.id] = self
 
     def update(self):
-        """Update the table row corresponding to the current Employee instance."""
-        sql = """
-            UPDATE employees
-            SET name = ?, job_title = ?, department_id = ?
-            WHERE id = ?
-        """
-        CURSOR.execute(sql, (self.name, self.job_title,
-                             self.department_id, self.id))
-        CONN.commit()
+        """Update the table row corresponding to the current Employee instance,
+        moving it to another shard if its department now belongs to one.
+        Raise StaleObjectError if the row's version no longer matches the instance's."""
+        if not shards.SHARDS:
+            return super().update()
+        target = shards.shard_for(self.department_id)
+        with CONN.transaction():
+            source, department_id = self._stored()
+            if source is None:
+                rowcount = 0
+            elif source == target:
+                sql = shards.update_sql(type(self), target)
+                rowcount = write(sql, self.values() + (self.id, self.version)).rowcount
+            else:
+                sql = shards.move_sql(type(self), source, target)
+                rowcount = write(sql, self.values() + (self.id, self.version)).rowcount
+                if rowcount:
+                    write(f"DELETE FROM {shards.table(source)} WHERE id = ?", (self.id,))
+            if rowcount and department_id != self.department_id:
+                self._count(department_id, -1)
+                self._count(self.department_id, 1)
+        if rowcount == 0:
+            raise StaleObjectError(
+                f"Employee {self.id} was changed or deleted since it was read")
+        self.version += 1
 
     def delete(self):
         """Delete the table row corresponding to the current Employee instance,
         delete the dictionary entry, and reassign id attribute"""
-
-        sql = """
-            DELETE FROM employees
-            WHERE id = ?
-        """
-
-        CURSOR.execute(sql, (self.id,))
-        CONN.commit()
-
-        # Delete the dictionary entry using id as the key
-        del type(self).all[self.id]
-
-        # Set the id to None
+        if not shards.SHARDS:
+            return super().delete()
+        with CONN.transaction():
+            shard, department_id = self._stored()
+            if shard is not None:
+                write(f"DELETE FROM {shards.table(shard)} WHERE id = ?", (self.id,))
+                self._count(department_id, -1)
+        if type(self).all.get(self.id) is self:
+            del type(self).all[self.id]
         self.id = None
 
-    @classmethod
-    def create(cls, name, job_title, department_id):
-        """ Initialize a new Employee instance and save the object to the database """
-        employee = cls(name, job_title, department_id)
-        employee.save()
-        return employee
-
-    @classmethod
-    def instance_from_db(cls, row):
-        """Return an Employee object having the attribute values from the table row."""
-
-        # Check the dictionary for  existing instance using the row's primary key
-        employee = cls.all.get(row[0])
-        if employee:
-            # ensure attributes match row values in case local instance was modified
-            employee.name = row[1]
-            employee.job_title = row[2]
-            employee.department_id = row[3]
-        else:
-            # not in dictionary, create new instance and add to dictionary
-            employee = cls(row[1], row[2], row[3])
-            employee.id = row[0]
-            cls.all[employee.id] = employee
-        return employee
-
-    @classmethod
-    def get_all(cls):
-        """Return a list containing one Employee object per table row"""
+    def _stored(self):
+        # the shard and department of the instance's row, None if it is gone
         sql = """
-            SELECT *
+            SELECT shard, department_id
             FROM employees
+            WHERE id = ?
         """
-
-        rows = CURSOR.execute(sql).fetchall()
-
-        return [cls.instance_from_db(row) for row in rows]
+        return CURSOR.execute(sql, (self.id,)).fetchone() or (None, None)
 
     @classmethod
     def find_by_id(cls, id):
         """Return Employee object corresponding to the table row matching the specified primary key"""
-        sql = """
-            SELECT *
-            FROM employees
-            WHERE id = ?
-        """
-
-        row = CURSOR.execute(sql, (id,)).fetchone()
-        return cls.instance_from_db(row) if row else None
+        if not shards.SHARDS or type(id) is not int:
+            return super().find_by_id(id)
+        # ids are allocated by the shard they were created in, where the row
+        # almost always still is
+        sql = cls.SELECT_SQL.replace(
+            f"FROM {cls.TABLE}", f"FROM {shards.table((id - 1) % shards.SHARDS)}")
+        row = reader().execute(sql + "WHERE id = ?", (id,)).fetchone()
+        return cls.instance_from_db(row) if row else super().find_by_id(id)
 
     @classmethod
-    def find_by_name(cls, name):
-        """Return Employee object corresponding to first table row matching specified name"""
-        sql = """
-            SELECT *
-            FROM employees
-            WHERE name is ?
-        """
-
-        row = CURSOR.execute(sql, (name,)).fetchone()
-        return cls.instance_from_db(row) if row else None
+    def refresh_incremental(cls):
+        """Bring the dictionary of saved objects up to date with the table.
+        Shards have no change log, so sharded tables are reloaded in full."""
+        if shards.SHARDS:
+            cls.synced_seq = None
+        return super().refresh_incremental()
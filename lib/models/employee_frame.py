@@ -0,0 +1,108 @@
+# lib/models/employee_frame.py
+import numpy as np
+
+from models.__init__ import reader
+
+
+class EmployeeFrame:
+    """Column-oriented snapshot of the employees table for analytics.
+
+    Each column is a NumPy array indexed by row position: ids and department
+    ids as int64, names as objects, and job titles dictionary-encoded as
+    int32 codes into the titles array. Filters, group-bys and the join with
+    departments run on whole arrays without creating Employee objects.
+    """
+
+    def __init__(self, ids, names, title_codes, titles, department_ids):
+        self.ids = ids
+        self.names = names
+        self.title_codes = title_codes
+        self.titles = titles
+        self.department_ids = department_ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"<EmployeeFrame: {len(self)} employees, {len(self.titles)} job titles>"
+
+    @classmethod
+    def load(cls, chunk_size=100_000):
+        """Read the employees table in chunks of chunk_size rows straight into columns"""
+        count = reader().execute("SELECT COUNT(*) FROM employees").fetchone()[0]
+        ids = np.empty(count, dtype=np.int64)
+        department_ids = np.empty(count, dtype=np.int64)
+        title_codes = np.empty(count, dtype=np.int32)
+        names = np.empty(count, dtype=object)
+        codes = {}
+
+        cursor = reader().execute("""
+            SELECT id, name, job_title, department_id
+            FROM employees
+            ORDER BY id
+        """)
+        start = 0
+        # rows inserted after the COUNT are left out of the snapshot
+        while start < count and (rows := cursor.fetchmany(min(chunk_size, count - start))):
+            end = start + len(rows)
+            chunk_ids, chunk_names, chunk_titles, chunk_departments = zip(*rows)
+            ids[start:end] = chunk_ids
+            names[start:end] = chunk_names
+            department_ids[start:end] = chunk_departments
+            title_codes[start:end] = [
+                codes.setdefault(title, len(codes)) for title in chunk_titles]
+            start = end
+        cursor.close()
+
+        titles = np.array(list(codes), dtype=object)
+        return cls(ids[:start], names[:start], title_codes[:start],
+                   titles, department_ids[:start])
+
+    @property
+    def job_titles(self):
+        """Decoded job title of every row"""
+        return self.titles[self.title_codes]
+
+    def where(self, mask):
+        """Return a frame holding the rows selected by a boolean mask or index array"""
+        return type(self)(self.ids[mask], self.names[mask], self.title_codes[mask],
+                          self.titles, self.department_ids[mask])
+
+    def in_department(self, *department_ids):
+        """Return a frame of the employees in any of the given departments"""
+        if len(department_ids) == 1:
+            return self.where(self.department_ids == department_ids[0])
+        return self.where(np.isin(self.department_ids, department_ids))
+
+    def with_job_title(self, job_title):
+        """Return a frame of the employees having the given job title"""
+        matches = np.flatnonzero(self.titles == job_title)
+        if not len(matches):
+            return self.where(np.zeros(len(self), dtype=bool))
+        return self.where(self.title_codes == matches[0])
+
+    def count_by_department(self):
+        """Return a dictionary mapping department id to employee count"""
+        values, counts = np.unique(self.department_ids, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+    def count_by_job_title(self):
+        """Return a dictionary mapping job title to employee count"""
+        counts = np.bincount(self.title_codes, minlength=len(self.titles))
+        return {title: count for title, count in zip(self.titles.tolist(), counts.tolist()) if count}
+
+    def join_departments(self):
+        """Return the name and location of each row's department as two arrays,
+        None where the department does not exist"""
+        rows = reader().execute(
+            "SELECT id, name, location FROM departments ORDER BY id").fetchall()
+        department_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        names = np.array([row[1] for row in rows] + [None], dtype=object)
+        locations = np.array([row[2] for row in rows] + [None], dtype=object)
+
+        # position of each employee's department, or the trailing None entry
+        positions = np.searchsorted(department_ids, self.department_ids)
+        found = positions < len(department_ids)
+        found[found] = department_ids[positions[found]] == self.department_ids[found]
+        positions[~found] = len(department_ids)
+        return names[positions], locations[positions]
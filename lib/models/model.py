@@ -0,0 +1,438 @@
+# lib/models/model.py
+from collections import namedtuple
+
+from models.__init__ import (
+    CURSOR, CONN, SCHEMA_UPGRADES, StaleObjectError, reader, write, with_retry)
+from models.changes import (
+    create_change_log, change_triggers, changes_since, latest_seq, pruned_seq)
+from models.query import Query
+
+# Largest number of ids bound into one "IN (...)" query
+IN_BATCH = 500
+
+# Largest number of distinct values kept in VALUE_POOL
+VALUE_POOL_SIZE = 10000
+
+
+class ValuePool(dict):
+    """Values shared by the objects hydrated from low-cardinality columns.
+
+    sqlite3 returns a new string for every row, so a million employees with
+    twenty distinct job titles would hold a million copies of them. The
+    hydrator looks each value of an INTERNED column up in the pool and keeps
+    the pooled copy instead. Once the pool holds limit values, new values are
+    kept as they are, so a column with more distinct values than expected
+    can't grow it without bound.
+    """
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+
+VALUE_POOL = ValuePool(VALUE_POOL_SIZE)
+
+# Rows inserted, updated and left unchanged by upsert_many()
+UpsertResult = namedtuple("UpsertResult", ["inserted", "updated", "unchanged"])
+
+
+class Model:
+    """Base class of the models persisted by the ORM.
+
+    A subclass declares its table and the columns after the id primary key,
+    each with its SQL type:
+
+        class Department(Model):
+            TABLE = "departments"
+            FIELDS = (("name", "TEXT"), ("location", "TEXT"))
+
+    When the subclass is created, the base generates its SQL statements, a
+    serializer returning the field values of an instance, and a hydrator
+    (instance_from_db) specialised to the subclass's columns. Every table
+    also gets a version column used by update() to detect conflicting writes,
+    and triggers recording its changes in the change log (see changes.py).
+
+    COMPUTED_FIELDS declares columns maintained by the database itself, e.g. by
+    triggers. They are read along with the fields but never written by the model.
+    INTERNED names the fields with few distinct values, whose values are shared
+    between the hydrated objects through VALUE_POOL. NATURAL_KEY names the
+    fields upsert_many() matches rows on by default; it is not a constraint
+    of the table, so create() and save() still accept rows sharing a key.
+    ROW_FORMAT formats the id and field values into the repr of an instance,
+    and of a row in listings; by default "<Model id: value, value>".
+    """
+
+    TABLE = None
+    FIELDS = ()
+    COMPUTED_FIELDS = ()
+    INTERNED = ()
+    NATURAL_KEY = ()
+    ROW_FORMAT = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.TABLE is None:
+            return
+
+        # Dictionary of objects saved to the database.
+        cls.all = {}
+
+        # Sequence number of the last change applied by refresh_incremental()
+        cls.synced_seq = None
+
+        # Upgrade older databases the first time the process connects to them
+        SCHEMA_UPGRADES.append(cls.upgrade_table)
+
+        names = tuple(name for name, type_ in cls.FIELDS)
+        cls.COMPUTED = tuple(name for name, type_ in cls.COMPUTED_FIELDS)
+        cls.COLUMNS = ("id",) + names + cls.COMPUTED
+        if cls.ROW_FORMAT is None:
+            cls.ROW_FORMAT = f"<{cls.__name__} {{}}: {', '.join('{}' for name in names)}>"
+
+        columns = ", ".join(cls.COLUMNS + ("version",))
+        definitions = ",\n            ".join(
+            f"{name} {type_}" for name, type_ in cls.FIELDS + cls.COMPUTED_FIELDS)
+        cls.CREATE_TABLE_SQL = f"""
+            CREATE TABLE IF NOT EXISTS {cls.TABLE} (
+            id INTEGER PRIMARY KEY,
+            {definitions},
+            version INTEGER NOT NULL DEFAULT 1)
+        """
+        cls.SELECT_SQL = f"""
+            SELECT {columns}
+            FROM {cls.TABLE}
+        """
+        cls.INSERT_SQL = f"""
+            INSERT INTO {cls.TABLE} ({", ".join(names)})
+            VALUES ({", ".join("?" for name in names)})
+        """
+        cls.UPDATE_SQL = f"""
+            UPDATE {cls.TABLE}
+            SET {", ".join(f"{name} = ?" for name in names)}, version = version + 1
+            WHERE id = ? AND version = ?
+        """
+        cls.values = _compile_serializer(cls, names)
+        cls.instance_from_db = classmethod(_compile_hydrator(cls, names + cls.COMPUTED))
+
+    def __repr__(self):
+        return self.ROW_FORMAT.format(self.id, *self.values())
+
+    @classmethod
+    def create_table(cls):
+        """ Create a new table to persist the attributes of instances """
+        CURSOR.execute(cls.CREATE_TABLE_SQL)
+        cls.upgrade_table()
+        create_change_log()
+        for sql in change_triggers(cls.TABLE):
+            CURSOR.execute(sql)
+        CONN.commit()
+
+    @classmethod
+    def upgrade_table(cls, conn=CONN):
+        """Bring a table created by an earlier version of the model up to date
+        through conn. Run by connect() the first time the process opens a
+        database, and by create_table(). Return the names of the columns added."""
+        return cls.add_missing_columns(conn)
+
+    @classmethod
+    def add_missing_columns(cls, conn=CONN):
+        """Add the version column and the computed columns a table created by an
+        earlier version of the model lacks. Return the names of the columns
+        added, None if the table doesn't exist."""
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({cls.TABLE})")}
+        if not existing:
+            return None
+        added = []
+        for name, type_ in cls.COMPUTED_FIELDS + (("version", "INTEGER NOT NULL DEFAULT 1"),):
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {cls.TABLE} ADD COLUMN {name} {type_}")
+                added.append(name)
+        return added
+
+    @classmethod
+    def drop_table(cls):
+        """ Drop the table that persists instances """
+        sql = f"""
+            DROP TABLE IF EXISTS {cls.TABLE};
+        """
+        CURSOR.execute(sql)
+        CONN.commit()
+
+    def save(self):
+        """ Insert a new row with the field values of the current instance.
+        Update object id attribute using the primary key value of new row.
+        Save the object in local dictionary using table row's PK as dictionary key"""
+        self.id = write(self.INSERT_SQL, self.values()).lastrowid
+        self.version = 1
+        type(self).all[self.id] = self
+
+    @classmethod
+    def create(cls, *args, **kwargs):
+        """ Initialize a new instance and save the object to the database """
+        instance = cls(*args, **kwargs)
+        instance.save()
+        return instance
+
+    def update(self):
+        """Update the table row corresponding to the current instance.
+        Raise StaleObjectError if the row's version no longer matches the instance's."""
+        result = write(self.UPDATE_SQL, self.values() + (self.id, self.version))
+        if result.rowcount == 0:
+            raise StaleObjectError(
+                f"{type(self).__name__} {self.id} was changed or deleted since it was read")
+        self.version += 1
+
+    def refresh(self):
+        """Reload the attribute values and version of the current instance from its row"""
+        sql = self.SELECT_SQL + "WHERE id = ?"
+        row = reader().execute(sql, (self.id,)).fetchone()
+        if row is None:
+            raise StaleObjectError(f"{type(self).__name__} {self.id} was deleted")
+        type(self).all[self.id] = self
+        type(self).instance_from_db(row)
+
+    def delete(self):
+        """Delete the table row corresponding to the current instance,
+        delete the dictionary entry, and reassign id attribute"""
+        sql = f"""
+            DELETE FROM {self.TABLE}
+            WHERE id = ?
+        """
+        write(sql, (self.id,))
+
+        # Delete the dictionary entry using id as the key, unless the id has
+        # been reused since by a row another thread inserted
+        if type(self).all.get(self.id) is self:
+            del type(self).all[self.id]
+
+        # Set the id to None
+        self.id = None
+
+    @classmethod
+    def get_all(cls):
+        """Return a list containing one object per table row"""
+        rows = reader().execute(cls.SELECT_SQL).fetchall()
+        hydrate = cls.instance_from_db
+        return cls.loaded_together([hydrate(row) for row in rows])
+
+    @classmethod
+    def loaded_together(cls, instances):
+        """Hook called with each list of objects read by one query, returned as is"""
+        return instances
+
+    @classmethod
+    def where(cls, **conditions):
+        """Return a lazy Query for the rows whose columns equal the given values (see query.py)"""
+        return Query(cls).where(**conditions)
+
+    @classmethod
+    def order_by(cls, *columns):
+        """Return a lazy Query for every row, sorted by columns (see query.py)"""
+        return Query(cls).order_by(*columns)
+
+    @classmethod
+    def upsert_many(cls, records, key=None):
+        """Insert or update one row per record, a tuple of field values in FIELDS
+        order, matching existing rows on the fields named by key (NATURAL_KEY
+        by default). Nothing makes the key unique: a record updates the first
+        row having its key, and of several records with the same key the last
+        one is written. Rows whose values are unchanged are left as they are.
+        The records are checked by check_records() and their key values can't
+        be None. They are written in a single transaction with one
+        executemany() per IN_BATCH of them, and the dictionary of saved objects
+        is brought up to date with the rows written.
+        Return an UpsertResult counting the rows inserted, updated and unchanged."""
+        key = tuple(key or cls.NATURAL_KEY)
+        if not key:
+            raise TypeError(f"{cls.__name__} declares no NATURAL_KEY; pass the key to upsert on")
+        names = cls.COLUMNS[1:len(cls.FIELDS) + 1]
+        for name in key:
+            if name not in names:
+                raise ValueError(f"{cls.__name__} has no field {name!r}")
+        positions = [names.index(name) for name in key]
+        records = cls.check_records(records)
+        latest = {}
+        for record in records:
+            values = tuple(record[i] for i in positions)
+            if None in values:
+                raise ValueError(f"{record} has no value for a field of the key {key}")
+            latest[values] = record
+        keys = list(latest)
+        # each key binds one parameter per field; stay within IN_BATCH of them
+        size = max(IN_BATCH // len(key), 1)
+
+        def upsert():
+            inserted = updated = 0
+            rows = []
+            with CONN.transaction():
+                for start in range(0, len(keys), size):
+                    batch = keys[start:start + size]
+                    existing = {}
+                    for row in cls._select_keys(key, batch):
+                        existing.setdefault(tuple(row[1 + i] for i in positions), row)
+                    new = [latest[values] for values in batch if values not in existing]
+                    # field values followed by the id and version the update checks
+                    changed = [latest[values] + (row[0], row[-1])
+                               for values, row in existing.items()
+                               if row[1:len(names) + 1] != latest[values]]
+                    cls._insert_many(new)
+                    if cls._update_many(changed) < len(changed):
+                        raise StaleObjectError(
+                            f"{cls.__name__} rows were changed while they were upserted")
+                    inserted += len(new)
+                    updated += len(changed)
+                    rows += cls._select_keys(key, batch)
+            return inserted, updated, rows
+
+        inserted, updated, rows = with_retry(CONN, upsert)
+        for row in rows:
+            cls.instance_from_db(row)
+        return UpsertResult(inserted, updated, len(records) - inserted - updated)
+
+    @classmethod
+    def check_records(cls, records):
+        """Return the records as a list of tuples, raising ValueError for the
+        first one the property setters reject"""
+        records = [tuple(record) for record in records]
+        for record in records:
+            cls(*record)
+        return records
+
+    @classmethod
+    def _insert_many(cls, records):
+        CURSOR.executemany(cls.INSERT_SQL, records)
+
+    @classmethod
+    def _update_many(cls, records):
+        # the number of rows updated
+        return CURSOR.executemany(cls.UPDATE_SQL, records).rowcount if records else 0
+
+    @classmethod
+    def _select_keys(cls, key, keys):
+        # the rows whose fields named by key equal one of keys, oldest first
+        placeholders = ", ".join(["(" + ", ".join("?" * len(key)) + ")"] * len(keys))
+        sql = cls.SELECT_SQL + f"""
+            WHERE ({", ".join(key)}) IN (VALUES {placeholders})
+            ORDER BY id
+        """
+        return CURSOR.execute(sql, [value for values in keys for value in values]).fetchall()
+
+    @classmethod
+    def refresh_incremental(cls):
+        """Bring the dictionary of saved objects up to date with the table by
+        applying only the rows changed since the last call. The first call, and
+        a call after changes it hadn't applied were pruned from the log, loads
+        every row. Return the number of rows applied."""
+        seq = latest_seq()
+        if cls.synced_seq is not None:
+            changes = changes_since(cls.synced_seq, cls.TABLE, until=seq)
+            # checked after reading the changes, as pruning them later does no harm
+            if pruned_seq() > cls.synced_seq:
+                cls.synced_seq = None
+        if cls.synced_seq is None:
+            rows = reader().execute(cls.SELECT_SQL).fetchall()
+            for id in set(cls.all) - {row[0] for row in rows}:
+                del cls.all[id]
+            for row in rows:
+                cls.instance_from_db(row)
+            cls.synced_seq = seq
+            return len(rows)
+
+        # only the last change to each row matters
+        ops = {row_id: op for _, _, op, row_id in changes}
+        changed = [id for id, op in ops.items() if op != "delete"]
+        for id, op in ops.items():
+            if op == "delete":
+                cls.all.pop(id, None)
+        cls._select_in(changed)
+        cls.synced_seq = seq
+        return len(ops)
+
+    @classmethod
+    def iter_rows(cls):
+        """Return a cursor streaming every table row, without creating objects"""
+        sql = f"""
+            SELECT {", ".join(cls.COLUMNS)}
+            FROM {cls.TABLE}
+        """
+        return reader().cursor().execute(sql)
+
+    @classmethod
+    def find_by_id(cls, id):
+        """Return the object corresponding to the table row matching the specified primary key"""
+        sql = cls.SELECT_SQL + "WHERE id = ?"
+        row = reader().execute(sql, (id,)).fetchone()
+        return cls.instance_from_db(row) if row else None
+
+    @classmethod
+    def find_by_ids(cls, ids):
+        """Return a dictionary of the objects with the specified primary keys.
+        Objects already in the dictionary of saved objects are used as they
+        are; the others are read together, one query per IN_BATCH ids."""
+        ids = set(ids)
+        cls._select_in([id for id in ids if id not in cls.all])
+        return {id: cls.all[id] for id in ids if id in cls.all}
+
+    @classmethod
+    def _select_in(cls, ids):
+        for start in range(0, len(ids), IN_BATCH):
+            batch = ids[start:start + IN_BATCH]
+            sql = cls.SELECT_SQL + f"WHERE id IN ({', '.join('?' * len(batch))})"
+            for row in reader().execute(sql, batch).fetchall():
+                cls.instance_from_db(row)
+
+    @classmethod
+    def find_by_name(cls, name):
+        """Return the object corresponding to first table row matching specified name"""
+        sql = cls.SELECT_SQL + "WHERE name is ?"
+        row = reader().execute(sql, (name,)).fetchone()
+        return cls.instance_from_db(row) if row else None
+
+
+def _compile(lines, name, **namespace):
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+
+def _compile_serializer(cls, names):
+    fields = "".join(f"self.{name}, " for name in names)
+    return _compile([
+        "def values(self):",
+        '    """Return the field values of the instance in column order"""',
+        f"    return ({fields})",
+    ], "values")
+
+
+def _compile_hydrator(cls, names):
+    # Fields backed by a validating property are stored in the property's
+    # underscored attribute; rows read from the table are trusted, so the
+    # hydrator assigns those directly instead of running the setters.
+    attributes = [
+        f"_{name}" if isinstance(getattr(cls, name, None), property) else name
+        for name in names
+    ]
+    values = [
+        f"pool.get(row[{index}]) or (pool.setdefault(row[{index}], row[{index}]) "
+        f"if len(pool) < pool.limit else row[{index}])"
+        if name in cls.INTERNED else f"row[{index}]"
+        for index, name in enumerate(names, start=1)
+    ]
+    lines = [
+        "def instance_from_db(cls, row):",
+        f'    """Return a {cls.__name__} object having the attribute values from the table row."""',
+        "    identity = cls.all",
+        "    instance = identity.get(row[0])",
+        "    if instance is None:",
+        "        instance = new(cls)",
+        "        instance.id = row[0]",
+        "        identity[row[0]] = instance",
+    ]
+    lines += [
+        f"    instance.{attribute} = {value}"
+        for attribute, value in zip(attributes, values)
+    ]
+    lines += [
+        f"    instance.version = row[{len(attributes) + 1}]",
+        "    return instance",
+    ]
+    return _compile(lines, "instance_from_db", new=object.__new__, pool=VALUE_POOL)
@@ -0,0 +1,104 @@
+# lib/models/query.py
+from models.__init__ import reader
+
+
+class Query:
+    """A lazily evaluated query on the table of a model.
+
+        Employee.where(department_id=3, job_title="Manager").order_by("name").limit(20)
+
+    Each method returns a new Query; nothing is read until the query is
+    iterated or one of count(), exists(), first() or all() is called, which
+    run a single parameterised statement. Iterating streams the rows from
+    their own cursor, hydrating each through the model's identity map.
+    """
+
+    def __init__(self, model, conditions=(), ordering=(), row_limit=None):
+        self.model = model
+        self.conditions = conditions
+        self.ordering = ordering
+        self.row_limit = row_limit
+
+    def where(self, **conditions):
+        """Return a query also restricted to the rows whose columns equal the given
+        values. None matches NULL, and a list, tuple or set matches any of its values."""
+        for column in conditions:
+            self._check(column)
+        return Query(self.model, self.conditions + tuple(conditions.items()),
+                     self.ordering, self.row_limit)
+
+    def order_by(self, *columns):
+        """Return a query sorting the rows by columns, descending for a column
+        prefixed with "-". Later calls sort by their columns after the earlier ones."""
+        for column in columns:
+            self._check(column[1:] if column.startswith("-") else column)
+        return Query(self.model, self.conditions, self.ordering + columns, self.row_limit)
+
+    def limit(self, count):
+        """Return a query reading at most count rows"""
+        return Query(self.model, self.conditions, self.ordering, count)
+
+    def __iter__(self):
+        sql, params = self._sql(self.model.SELECT_SQL)
+        hydrate = self.model.instance_from_db
+        for row in reader().cursor().execute(sql, params):
+            yield hydrate(row)
+
+    def all(self):
+        """Return a list of the objects matching the query"""
+        return self.model.loaded_together(list(self))
+
+    def first(self):
+        """Return the first object matching the query, None if there is none"""
+        sql, params = self.limit(1)._sql(self.model.SELECT_SQL)
+        row = reader().execute(sql, params).fetchone()
+        return self.model.instance_from_db(row) if row else None
+
+    def count(self):
+        """Return the number of rows matching the query"""
+        sql, params = self._sql(f"""
+            SELECT id
+            FROM {self.model.TABLE}
+        """)
+        return reader().execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+    def exists(self):
+        """Return True if any row matches the query"""
+        sql, params = self._sql(f"""
+            SELECT 1
+            FROM {self.model.TABLE}
+        """)
+        return bool(reader().execute(f"SELECT EXISTS ({sql})", params).fetchone()[0])
+
+    def __repr__(self):
+        return f"<Query {self._sql(self.model.SELECT_SQL)}>"
+
+    def _check(self, column):
+        # column names are written into the statement, so only known ones are accepted
+        if column not in self.model.COLUMNS:
+            raise ValueError(f"{self.model.__name__} has no column {column!r}")
+
+    def _sql(self, select):
+        clauses = []
+        params = []
+        for column, value in self.conditions:
+            if value is None:
+                clauses.append(f"{column} IS NULL")
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                values = list(value)
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params += values
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        sql = select
+        if clauses:
+            sql += f"WHERE {' AND '.join(clauses)}\n"
+        if self.ordering:
+            sql += "ORDER BY " + ", ".join(
+                f"{column[1:]} DESC" if column.startswith("-") else column
+                for column in self.ordering) + "\n"
+        if self.row_limit is not None:
+            sql += "LIMIT ?\n"
+            params.append(self.row_limit)
+        return sql, params
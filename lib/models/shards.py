@@ -0,0 +1,107 @@
+# lib/models/shards.py
+"""Optional sharded storage for the employees table.
+
+With COMPANY_DB_SHARDS=N, employee rows live in N database files next to the
+main one (company-employees-0.db, ...), each employee in shard
+department_id % N. Writers to different shards lock different files, so they
+proceed in parallel. Every connection ATTACHes the shards as shard0..shardN-1
+and gets a TEMP view named employees over all of them, so queries that read
+"FROM employees" fan out across the shards unchanged.
+
+The shards use a rollback journal rather than WAL, so that a transaction
+moving employees between shards commits in all of them or in none. The main
+database stays in WAL mode, which makes a transaction writing to it and to a
+shard, such as deleting a department along with its employees, atomic for
+each file only: a crash while it commits can leave the department deleted
+and its employees in place, or the other way round.
+
+The employee counts of the departments, in the main database, are updated
+in a transaction of their own after each write to a shard commits, so that
+writers to different shards never wait on the main database's lock; after a
+crash, `database backfill` recounts them.
+
+Every connection attaches all the shards, and SQLite attaches at most
+MAX_SHARDS databases to a connection, so COMPANY_DB_SHARDS can't exceed it.
+
+Ids stay unique across shards: shard k allocates ids congruent to k + 1
+modulo N, above the shard's AUTOINCREMENT high-water mark. An employee moved
+to another department's shard keeps its id.
+"""
+import os
+import re
+
+# Databases SQLite attaches to one connection at most, unless it was
+# compiled with a larger SQLITE_MAX_ATTACHED
+MAX_SHARDS = 10
+
+# Number of employee shards, 0 to keep employees in the main database
+SHARDS = int(os.environ.get("COMPANY_DB_SHARDS", 0))
+if not 0 <= SHARDS <= MAX_SHARDS:
+    raise ValueError(f"COMPANY_DB_SHARDS must be from 0 to {MAX_SHARDS}, not {SHARDS}")
+
+
+def shard_path(database, shard):
+    """Return the file holding shard number shard of the database file"""
+    base, ext = os.path.splitext(database)
+    return f"{base}-employees-{shard}{ext}"
+
+
+def shard_for(department_id):
+    """Return the shard number holding the employees of a department"""
+    return department_id % SHARDS
+
+
+def table(shard):
+    """Return the qualified name of the employees table in a shard"""
+    return f"shard{shard}.employees"
+
+
+def attach(conn, database):
+    """Attach the shards of database to conn and create the employees view over them"""
+    for shard in range(SHARDS):
+        conn.execute("ATTACH DATABASE ? AS ?",
+                     (shard_path(database, shard), f"shard{shard}"))
+    union = " UNION ALL ".join(
+        f"SELECT *, {shard} AS shard FROM {table(shard)}" for shard in range(SHARDS))
+    conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS employees AS {union}")
+
+
+def create_table_sql(cls, shard):
+    """Return the statement creating the table of model cls in a shard. Foreign
+    keys can't reference a table in another database file, so they are left out."""
+    sql = re.sub(r" REFERENCES \w+\(\w+\)( ON DELETE [A-Z ]+?)?(?=,|\n)", "",
+                 cls.CREATE_TABLE_SQL)
+    return sql.replace(
+        f"IF NOT EXISTS {cls.TABLE} (", f"IF NOT EXISTS {table(shard)} (").replace(
+        "id INTEGER PRIMARY KEY,", "id INTEGER PRIMARY KEY AUTOINCREMENT,")
+
+
+def insert_sql(cls, shard):
+    """Return the statement inserting a row of model cls into a shard with a
+    newly allocated id, the next id above the shard's high-water mark that is
+    congruent to shard + 1"""
+    names = cls.COLUMNS[1:]
+    last_id = f"""COALESCE((
+                SELECT seq FROM shard{shard}.sqlite_sequence WHERE name = '{cls.TABLE}'), 0)"""
+    return f"""
+        INSERT INTO {table(shard)} (id, {", ".join(names)})
+        VALUES ({last_id} + (({shard} - {last_id}) % {SHARDS} + {SHARDS}) % {SHARDS} + 1,
+                {", ".join("?" for name in names)})
+    """
+
+
+def update_sql(cls, shard):
+    """Return the version-checked statement updating a row of model cls in a shard"""
+    return cls.UPDATE_SQL.replace(f"UPDATE {cls.TABLE}", f"UPDATE {table(shard)}")
+
+
+def move_sql(cls, source, target):
+    """Return the version-checked statement copying a row of model cls from shard
+    source to shard target with new field values"""
+    names = cls.COLUMNS[1:]
+    return f"""
+        INSERT INTO {table(target)} (id, {", ".join(names)}, version)
+        SELECT id, {", ".join("?" for name in names)}, version + 1
+        FROM {table(source)}
+        WHERE id = ? AND version = ?
+    """
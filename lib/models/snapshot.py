@@ -0,0 +1,138 @@
+# lib/models/snapshot.py
+import os
+import sqlite3
+import time
+
+from models.__init__ import connect, BUSY_TIMEOUT
+from models import shards
+
+# Pages copied per backup step, -1 for the whole database in one step. SQLite
+# restarts a backup whenever another connection writes to the source between
+# two steps, so under a steady write load a copy made in several steps may
+# never finish. In WAL mode a single step only holds a read transaction, and
+# writers carry on while it runs.
+PAGES_PER_STEP = -1
+
+# Seconds to pause between the steps of a copy made in several steps, so
+# that writers waiting on the database lock get a turn
+STEP_PAUSE = 0.005
+
+# Restarts caused by writes to the source after which a backup gives up
+MAX_RESTARTS = 10
+
+# Result codes of a backup step that found the database locked; sqlite3 only
+# exports them from Python 3.11
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+def snapshot(target, pages=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None):
+    """Copy the live database to the file target with the SQLite backup API,
+    while other connections keep reading and writing. The copy is made in a
+    single step, or pages at a time, pausing between steps; a write to the
+    database between two steps restarts it, and OperationalError is raised
+    after MAX_RESTARTS restarts. progress(remaining, total) is called after
+    each step with page counts. With shards, each shard is then copied
+    to the file shards.shard_path(target, n) the same way; the files are copied
+    one after the other, so a write made in between is in some of them only."""
+    source = connect()
+    try:
+        for name, path in _files(target):
+            destination = sqlite3.connect(path)
+            try:
+                source.backup(destination, pages=pages, name=name,
+                              progress=_stepper(pause, progress))
+            finally:
+                destination.close()
+    finally:
+        source.close()
+
+
+def restore(source_file, pages=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None):
+    """Replace the contents of the live database, and of its shards, with the
+    snapshot source_file and the shard files next to it.
+    Objects already loaded by the models are not updated: reload them, e.g.
+    with refresh_incremental() after resetting its synced_seq to None."""
+    for name, path in _files(source_file):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path}: no such snapshot file")
+    destination = connect()
+    try:
+        live = _attached(destination)
+        for name, path in _files(source_file):
+            source = sqlite3.connect(path)
+            # the backup API writes to the main database of its destination,
+            # so each shard is restored through a connection of its own
+            target = destination if name == "main" else sqlite3.connect(
+                live[name], timeout=BUSY_TIMEOUT)
+            try:
+                source.backup(target, pages=pages, progress=_stepper(pause, progress))
+            finally:
+                if target is not destination:
+                    target.close()
+                source.close()
+    finally:
+        destination.close()
+
+
+def vacuum_into(target):
+    """Write a compacted copy of the live database, and of each of its shards,
+    to the new file target and the shard files next to it.
+    Smaller than snapshot()'s copy, which keeps the free pages of the database."""
+    source = connect()
+    try:
+        live = _attached(source)
+        for name, path in _files(target):
+            # a shard is vacuumed through a connection of its own: rebuilding
+            # its indexes would otherwise find the TEMP view over the shards
+            # where their table should be
+            conn = source if name == "main" else sqlite3.connect(
+                live[name], timeout=BUSY_TIMEOUT)
+            try:
+                conn.execute("VACUUM INTO ?", (path,))
+            finally:
+                if conn is not source:
+                    conn.close()
+    finally:
+        source.close()
+
+
+def _attached(conn):
+    # the file of each database attached to conn, by schema name
+    return {name: path for _, name, path in conn.execute("PRAGMA database_list")}
+
+
+def _files(database):
+    # (schema name, file) of the main database and each shard, for the copy database
+    return [("main", database)] + [
+        (f"shard{shard}", shards.shard_path(database, shard)) for shard in range(shards.SHARDS)]
+
+
+def _stepper(pause, progress):
+    # sqlite3 retries a step that found the database locked forever; give up
+    # after the busy timeout like any other statement would. A backup that
+    # restarted has more pages remaining than after the previous step.
+    busy_since = None
+    last_remaining = None
+    restarts = 0
+
+    def step(status, remaining, total):
+        nonlocal busy_since, last_remaining, restarts
+        if status in (SQLITE_BUSY, SQLITE_LOCKED):
+            busy_since = busy_since or time.monotonic()
+            if time.monotonic() - busy_since > BUSY_TIMEOUT:
+                raise sqlite3.OperationalError("database is locked")
+            return
+        busy_since = None
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise sqlite3.OperationalError(
+                    f"backup restarted {restarts} times by writes to the database; "
+                    "copy it in one step (pages=-1)")
+        last_remaining = remaining
+        if progress:
+            progress(remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+    return step
@@ -0,0 +1,87 @@
+# lib/models/write_queue.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from models.__init__ import WriteResult, connect, is_busy, backoff, WRITE_RETRIES
+
+
+class WriteQueue:
+    """Single writer thread running the write statements submitted by any thread.
+    Statements that queue up while a transaction is being committed are run
+    together in the next one, so many small writes cost one commit (and one
+    acquisition of the database lock) per group instead of one each."""
+
+    def __init__(self, database=None, max_batch=500):
+        self.database = database
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="write-queue", daemon=True)
+        self.thread.start()
+
+    def submit(self, sql, params=()):
+        """Queue a write statement and return a Future resolving to its WriteResult"""
+        future = Future()
+        self.requests.put((sql, params, future))
+        return future
+
+    def execute(self, sql, params=()):
+        """Queue a write statement and wait until it is committed"""
+        return self.submit(sql, params).result()
+
+    def close(self):
+        """Commit the statements already queued and stop the writer thread"""
+        self.requests.put(None)
+        self.thread.join()
+
+    def _run(self):
+        conn = connect(self.database)
+        closing = False
+        while not closing:
+            batch = []
+            request = self.requests.get()
+            while request is not None:
+                batch.append(request)
+                if len(batch) == self.max_batch:
+                    break
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+            closing = request is None
+            if batch:
+                self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn, batch):
+        # Run the whole group in one transaction. A statement that fails on its
+        # own (e.g. a constraint) only fails its own future; if the database is
+        # busy the group is rolled back and retried with backoff.
+        for attempt in range(WRITE_RETRIES + 1):
+            results = []
+            try:
+                cursor = conn.cursor()
+                for sql, params, future in batch:
+                    try:
+                        cursor.execute(sql, params)
+                        results.append(WriteResult(cursor.lastrowid, cursor.rowcount))
+                    except Exception as exc:
+                        if is_busy(exc):
+                            raise
+                        results.append(exc)
+                conn.commit()
+                break
+            except Exception as exc:
+                conn.rollback()
+                if not is_busy(exc) or attempt == WRITE_RETRIES:
+                    results = [exc] * len(batch)
+                    break
+                time.sleep(backoff(attempt))
+
+        for (sql, params, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,64 @@
+"""Profile CLI actions and model calls.
+
+    python lib/cli.py --profile profiles/           # every menu action
+    python lib/cli.py --profile profiles/ --batch edits.txt
+    COMPANY_PROFILE=profiles/ python my_report.py   # profiled() blocks in library code
+
+Each profiled action writes its cProfile stats to <directory>/<action>-<time>.prof
+(open with `python -m pstats` or snakeviz) and prints a summary of its wall
+time, the SQL statements it ran and the functions it spent the most time in.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+# Directory receiving stats files when profiling is enabled from the environment
+PROFILE_DIR = os.environ.get("COMPANY_PROFILE")
+
+# Functions listed in each summary
+TOP_FUNCTIONS = 8
+
+
+@contextmanager
+def profiled(action, directory=None, top=TOP_FUNCTIONS, out=None):
+    """Profile the block as action when a directory is given or COMPANY_PROFILE is set,
+    otherwise run it unprofiled"""
+    directory = directory or PROFILE_DIR
+    if not directory:
+        yield
+        return
+
+    from models.__init__ import statement_count
+    os.makedirs(directory, exist_ok=True)
+    profiler = cProfile.Profile()
+    statements = statement_count()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        statements = statement_count() - statements
+        path = os.path.join(
+            directory, f"{action}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof")
+        profiler.dump_stats(path)
+        summarize(action, elapsed, statements, pstats.Stats(profiler), path, top,
+                  out or sys.stderr)
+
+
+def summarize(action, elapsed, statements, stats, path, top, out):
+    print(f"[profile] {action}: {elapsed * 1000:.1f} ms, "
+          f"{statements} SQL statements, stats in {path}", file=out)
+    # (file, line, function) -> (primitive calls, calls, own time, cumulative time, callers)
+    entries = sorted(
+        (item for item in stats.stats.items()
+         if os.path.basename(item[0][0]) not in ("profiling.py", "contextlib.py")),
+        key=lambda item: item[1][3], reverse=True)
+    for (filename, line, function), (_, calls, own, cumulative, _) in entries[:top]:
+        location = f"{os.path.basename(filename)}:{line}" if line else filename
+        print(f"[profile]   {cumulative * 1000:9.1f} ms cumulative {own * 1000:9.1f} ms own "
+              f"{calls:8d} calls  {function} ({location})", file=out)
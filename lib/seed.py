@@ -21,5 +21,6 @@ def seed_database():
     Employee.create("Hao", "New Hires Coordinator", human_resources.id)
 
 
-seed_database()
-print("Seeded database")
+if __name__ == "__main__":
+    seed_database()
+    print("Seeded database")
@@ -0,0 +1,129 @@
+from models.__init__ import CONN, CURSOR
+from models.department import Department
+from batch import main, run_batch, run_command
+import pytest
+
+
+class TestBatch:
+    '''Batch mode in batch.py'''
+
+    def test_runs_commands(self):
+        '''runs create, update and delete commands and counts them.'''
+
+        succeeded, failures = run_batch([
+            'department create "Payroll" "Building A, 5th Floor"',
+            '# comment lines and blank lines are skipped',
+            '',
+            'employee create "Amir" "Accountant" 1',
+            'employee create "Bola" "Manager" 1',
+            'employee update 1 "Amir" "Senior Accountant" 1',
+            'employee delete 2',
+        ])
+
+        assert ((succeeded, failures) == (5, []))
+        rows = CURSOR.execute(
+            "SELECT id, name, job_title, department_id FROM employees").fetchall()
+        assert (rows == [(1, "Amir", "Senior Accountant", 1)])
+
+    def test_reports_failures(self):
+        '''reports failed commands by line number and keeps the successful ones.'''
+
+        succeeded, failures = run_batch([
+            'department create "Payroll" "Building A, 5th Floor"',
+            'employee create "Amir" "Accountant" 99',
+            'employee fire 1',
+        ])
+
+        assert (succeeded == 1)
+        assert ([number for number, line, exc in failures] == [2, 3])
+        assert (CURSOR.execute(
+            "SELECT COUNT(*) FROM departments").fetchone()[0] == 1)
+
+    def test_atomic_rolls_back(self):
+        '''rolls back every command of an atomic batch when one fails.'''
+
+        succeeded, failures = run_batch([
+            'department create "Payroll" "Building A, 5th Floor"',
+            'department update 7 "Sales" "Building B"',
+        ], atomic=True)
+
+        assert (succeeded == 0)
+        assert (len(failures) == 1)
+        assert (CURSOR.execute(
+            "SELECT COUNT(*) FROM departments").fetchone()[0] == 0)
+
+    def test_checks_arguments(self):
+        '''rejects commands with the wrong number of arguments.'''
+
+        with pytest.raises(ValueError):
+            run_command(["department", "create", "Payroll"])
+
+    def test_missing_batch_file(self, tmp_path, capsys):
+        '''reports a batch file that can't be opened as a usage error.'''
+
+        with pytest.raises(SystemExit) as exc_info:
+            main(["--batch", str(tmp_path / "missing.txt")])
+        assert (exc_info.value.code == 2)
+        assert ("can't open" in capsys.readouterr().err)
+
+    def test_failed_command_leaves_no_writes(self, monkeypatch):
+        '''undoes the writes of a command that fails part way, keeping the other commands.'''
+        import batch
+
+        def create_twice(name):
+            Department.create(name, "Building A")
+            raise ValueError("second write failed")
+        monkeypatch.setitem(batch.COMMANDS, ("department", "twice"), create_twice)
+
+        succeeded, failures = run_batch([
+            'department create "Payroll" "Building A, 5th Floor"',
+            'department twice "Sales"',
+            'department create "Human Resources" "Building C, East Wing"',
+        ])
+
+        assert ((succeeded, len(failures)) == (2, 1))
+        assert (CURSOR.execute("SELECT name FROM departments ORDER BY id").fetchall() ==
+                [("Payroll",), ("Human Resources",)])
+
+    def test_nested_transaction_rolls_back(self):
+        '''rolls back only the inner block of nested transactions when it raises.'''
+        Department.create_table()
+        with CONN.transaction():
+            Department.create("Payroll", "Building A, 5th Floor")
+            with pytest.raises(ValueError):
+                with CONN.transaction():
+                    Department.create("Sales", "Building B")
+                    raise ValueError()
+        CONN.rollback()  # nothing left to roll back: the outer block committed
+
+        assert (CURSOR.execute("SELECT name FROM departments").fetchall() == [("Payroll",)])
+
+    def test_upgrades_older_database(self):
+        '''adds the columns a database created before versioning lacks, then runs commands on it.'''
+        CURSOR.execute("CREATE TABLE departments (id INTEGER PRIMARY KEY, name TEXT, location TEXT)")
+        CURSOR.execute("CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, job_title TEXT, department_id INTEGER, FOREIGN KEY (department_id) REFERENCES departments(id))")
+        CURSOR.execute("INSERT INTO departments (name, location) VALUES ('Payroll', 'Building A')")
+        CURSOR.execute("INSERT INTO employees (name, job_title, department_id) VALUES ('Amir', 'Clerk', 1)")
+
+        succeeded, failures = run_batch([
+            'employee create "Bola" "Clerk" 1',
+            'employee update 1 "Amir" "Accountant" 1',
+        ])
+
+        assert ((succeeded, failures) == (2, []))
+        assert (CURSOR.execute("SELECT name, job_title, version FROM employees").fetchall() ==
+                [("Amir", "Accountant", 2), ("Bola", "Clerk", 1)])
+        assert (CURSOR.execute("SELECT version, employee_count FROM departments").fetchall() ==
+                [(1, 2)])
+
+    def test_after_commit(self):
+        '''calls the functions registered in a transaction after it commits, except those of rolled back blocks.'''
+        calls = []
+        with CONN.transaction():
+            CONN.after_commit(lambda: calls.append("outer"))
+            with pytest.raises(ValueError):
+                with CONN.transaction():
+                    CONN.after_commit(lambda: calls.append("inner"))
+                    raise ValueError()
+            assert (calls == [])
+        assert (calls == ["outer"])
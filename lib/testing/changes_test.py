@@ -0,0 +1,89 @@
+from models.__init__ import CONN, CURSOR, set_trace_callback
+from models.changes import changes_since, create_change_log, latest_seq, prune_changes
+import models.changes
+from models.department import Department
+import pytest
+
+
+class TestChanges:
+    '''Change log in changes.py'''
+
+    @pytest.fixture(autouse=True)
+    def create_tables(self):
+        '''create tables and the change log prior to each test.'''
+        Department.create_table()
+
+    def test_logs_changes(self):
+        '''records every insert, update and delete in sequence.'''
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        department.location = "Building B"
+        department.update()
+        department.delete()
+
+        assert ([change[1:] for change in changes_since(0)] == [
+            ("departments", "insert", 1),
+            ("departments", "update", 1),
+            ("departments", "delete", 1),
+        ])
+        assert (changes_since(latest_seq()) == [])
+
+    def test_prunes_changes(self):
+        '''deletes the changes up to a sequence number.'''
+        Department.create("Payroll", "Building A, 5th Floor")
+        Department.create("Human Resources", "Building C, East Wing")
+        prune_changes(1)
+        assert ([change[0] for change in changes_since(0)] == [2])
+
+    def test_refresh_incremental(self):
+        '''applies only the changed rows to the dictionary of saved objects.'''
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        marketing = Department.create("Marketing", "Building B, 3rd Floor")
+        assert (Department.refresh_incremental() == 2)
+
+        # changes made by another process
+        CURSOR.execute("UPDATE departments SET location = 'Building Z' WHERE id = ?",
+                       (payroll.id,))
+        CURSOR.execute("INSERT INTO departments (name, location) VALUES ('Sales', 'Building D')")
+        CURSOR.execute("DELETE FROM departments WHERE id = ?", (marketing.id,))
+        CONN.commit()
+
+        statements = []
+        set_trace_callback(statements.append)
+        try:
+            assert (Department.refresh_incremental() == 3)
+        finally:
+            set_trace_callback(None)
+
+        assert (payroll.location == "Building Z")
+        assert (sorted(Department.all) == [payroll.id, 3])
+        assert (Department.all[3].name == "Sales")
+        # the latest sequence number, the changes, the pruned sequence number
+        # and the changed rows
+        assert (len(statements) == 4)
+        assert (Department.refresh_incremental() == 0)
+
+    def test_refresh_after_prune(self):
+        '''reloads every row when changes it hadn't applied were pruned from the log.'''
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        Department.refresh_incremental()
+        CURSOR.execute("UPDATE departments SET location = 'Building Z' WHERE id = ?",
+                       (payroll.id,))
+        CURSOR.execute("INSERT INTO departments (name, location) VALUES ('Sales', 'Building D')")
+        CONN.commit()
+        prune_changes(latest_seq())
+
+        assert (Department.refresh_incremental() == 2)
+        assert (payroll.location == "Building Z")
+        assert (sorted(department.name for department in Department.all.values()) ==
+                ["Payroll", "Sales"])
+        assert (Department.refresh_incremental() == 0)
+
+    def test_keeps_recent_changes(self, monkeypatch):
+        '''deletes the oldest changes once the log holds CHANGE_LOG_ROWS of them.'''
+        CURSOR.execute("DROP TABLE changes")
+        monkeypatch.setattr(models.changes, "CHANGE_LOG_ROWS", 3)
+        create_change_log()
+        for name in "ABCDE":
+            Department.create(name, "Building A")
+        assert ([change[0] for change in changes_since(0)] == [3, 4, 5])
+        assert (latest_seq() == 5)
@@ -0,0 +1,118 @@
+from models.__init__ import CONN, CURSOR, connect, with_retry, enable_write_queue, disable_write_queue
+from models.department import Department
+from models.employee import Employee
+import models.__init__
+import sqlite3
+import threading
+import time
+import pytest
+
+
+class TestWriteContention:
+    '''Write contention handling in models/__init__.py'''
+
+    @pytest.fixture(autouse=True)
+    def create_tables(self, monkeypatch):
+        '''create tables and skip retry delays in each test.'''
+        Department.create_table()
+        Employee.create_table()
+        monkeypatch.setattr(models.__init__, "RETRY_DELAY", 0)
+
+    def test_retries_busy_writes(self):
+        '''retries a write that failed with "database is locked".'''
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError("database is locked")
+            return "done"
+
+        assert (with_retry(CONN, flaky) == "done")
+        assert (len(calls) == 3)
+
+    def test_does_not_retry_other_errors(self):
+        '''raises errors other than a busy database straight away.'''
+        calls = []
+
+        def broken():
+            calls.append(1)
+            raise sqlite3.OperationalError("no such table: offices")
+
+        with pytest.raises(sqlite3.OperationalError):
+            with_retry(CONN, broken)
+        assert (len(calls) == 1)
+
+    def test_waits_for_lock(self):
+        '''saves once another connection releases its write lock.'''
+        locked = threading.Event()
+
+        def hold_lock():
+            other = connect()
+            other.execute("BEGIN IMMEDIATE")
+            locked.set()
+            time.sleep(0.2)
+            other.commit()
+            other.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait()
+        try:
+            department = Department.create("Payroll", "Building A, 5th Floor")
+        finally:
+            thread.join()
+        assert (Department.find_by_id(department.id) is department)
+
+    def test_write_queue(self):
+        '''runs model writes from many threads through the write queue.'''
+        enable_write_queue()
+        errors = []
+
+        def create(n):
+            try:
+                for i in range(20):
+                    Department.create(f"Department {n}-{i}", "Building A")
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=create, args=(n,)) for n in range(8)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            disable_write_queue()
+
+        assert (errors == [])
+        assert (CURSOR.execute(
+            "SELECT COUNT(*) FROM departments").fetchone()[0] == 160)
+        assert (sorted(Department.all) == list(range(1, 161)))
+
+    def test_reads_do_not_block_writes(self):
+        '''serves queries from a read-only connection while writes go through CONN.'''
+        if not models.__init__.SPLIT_READS:
+            pytest.skip("reads are not split (COMPANY_DB_SPLIT_READS=0)")
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        for n in range(3):
+            Employee.create(f"Employee {n}", "Clerk", department.id)
+
+        # a report still streaming its rows
+        rows = Employee.iter_rows()
+        try:
+            assert (rows.connection is models.__init__.READER._target())
+            rows.fetchone()
+            Employee.create("Amir", "Accountant", department.id)
+            assert (len(rows.fetchall()) == 2)
+        finally:
+            rows.close()
+
+        with pytest.raises(sqlite3.OperationalError):
+            models.__init__.READER.execute("DELETE FROM employees")
+
+        # inside a transaction reads see its uncommitted changes
+        with CONN.transaction():
+            hr = Department.create("Human Resources", "Building C, East Wing")
+            assert (models.__init__.reader() is CONN)
+            assert (Department.find_by_name("Human Resources") is hr)
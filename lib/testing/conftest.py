@@ -1,4 +1,50 @@
 #!/usr/bin/env python3
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+
+# Every pytest process, including each pytest-xdist worker, gets a database
+# of its own, kept in shared memory where the platform has it. COMPANY_DB has
+# to be set before the models are imported, as they read it at import time.
+_worker = os.environ.get("PYTEST_XDIST_WORKER", "main")
+_directory = tempfile.mkdtemp(
+    prefix=f"company-{_worker}-",
+    dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+os.environ["COMPANY_DB"] = os.path.join(_directory, "company.db")
+
+from models.__init__ import CURSOR  # noqa: E402
+from models.model import Model  # noqa: E402
+import models.department  # noqa: E402, F401
+import models.employee  # noqa: E402, F401
+
+# Copying this empty database over the test database resets it in one step
+_EMPTY = sqlite3.connect(":memory:")
+
+
+def _models(cls=Model):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _models(subclass)
+
+
+@pytest.fixture(autouse=True)
+def isolated_database():
+    '''start every test with an empty database and empty object dictionaries.'''
+    conn = CURSOR.connection
+    conn.rollback()
+    _EMPTY.backup(conn)
+    for cls in _models():
+        cls.all = {}
+        cls.synced_seq = None
+    yield
+
+
+def pytest_sessionfinish(session):
+    shutil.rmtree(_directory, ignore_errors=True)
+
 
 def pytest_itemcollected(item):
     par = item.parent.obj
@@ -6,4 +52,4 @@ def pytest_itemcollected(item):
     pref = par.__doc__.strip() if par.__doc__ else par.__class__.__name__
     suf = node.__doc__.strip() if node.__doc__ else node.__name__
     if pref or suf:
-        item._nodeid = ' '.join((pref, suf))
\ No newline at end of file
+        item._nodeid = ' '.join((pref, suf))
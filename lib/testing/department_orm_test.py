@@ -1,4 +1,4 @@
-from models.__init__ import CONN, CURSOR
+from models.__init__ import CONN, CURSOR, StaleObjectError, update_with_refresh, set_trace_callback
 from models.department import Department
 import pytest
 
@@ -228,3 +228,204 @@ class TestDepartment:
                 (employee1.id, employee1.name, employee1.job_title, employee1.department_id))
         assert ((employees[1].id, employees[1].name, employees[1].job_title, employees[1].department_id) ==
                 (employee2.id, employee2.name, employee2.job_title, employee2.department_id))
+
+    def test_update_detects_conflict(self):
+        '''contains a method "update()" that raises StaleObjectError when the row changed since it was read.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+
+        # a second copy, as another process would hold
+        Department.all = {}
+        other = Department.find_by_id(department.id)
+        other.location = "Building B"
+        other.update()
+        assert (other.version == 2)
+
+        department.location = "Building C"
+        with pytest.raises(StaleObjectError):
+            department.update()
+        assert (Department.find_by_id(department.id).location == "Building B")
+
+    def test_update_with_refresh(self):
+        '''reloads the instance and reapplies the change after a conflict.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        CURSOR.execute(
+            "UPDATE departments SET name = 'Accounts', version = version + 1")
+
+        def move(department):
+            department.location = "Building C"
+        update_with_refresh(department, move)
+
+        assert ((department.name, department.location, department.version) ==
+                ("Accounts", "Building C", 3))
+        row = CURSOR.execute("SELECT * FROM departments").fetchone()
+        assert (row == (department.id, "Accounts", "Building C", 0, 3))
+
+    def test_find_by_ids(self):
+        '''contains method "find_by_ids()" that reads only the departments not already loaded.'''
+        Department.create_table()
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        hr = Department.create("Human Resources", "Building C, East Wing")
+        del Department.all[hr.id]
+
+        statements = []
+        set_trace_callback(statements.append)
+        try:
+            departments = Department.find_by_ids([payroll.id, hr.id, 99])
+        finally:
+            set_trace_callback(None)
+
+        assert (len(statements) == 1)
+        assert (departments[payroll.id] is payroll)
+        assert ((departments[hr.id].name, departments[hr.id].location) ==
+                ("Human Resources", "Building C, East Wing"))
+        assert (99 not in departments)
+
+    def test_employee_count(self):
+        '''has an "employee_count" kept up to date by triggers on the employees table.'''
+        from models.employee import Employee
+        CURSOR.execute("DROP TABLE IF EXISTS employees")
+        Department.create_table()
+        Employee.create_table()
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        hr = Department.create("Human Resources", "Building C, East Wing")
+        assert (payroll.employee_count == 0)
+
+        amir = Employee.create("Amir", "Accountant", payroll.id)
+        Employee.create("Bola", "Manager", payroll.id)
+        Employee.create("Chen", "Recruiter", hr.id).delete()
+        amir.department_id = hr.id
+        amir.update()
+
+        assert ([(department.id, department.employee_count)
+                 for department in Department.get_all()] == [(payroll.id, 1), (hr.id, 1)])
+        # the count is left out of the repr, but listed with the other columns
+        from listing import write_listing
+        import io
+        out = io.StringIO()
+        write_listing(Department, Department.iter_rows(), "csv", out)
+        assert (out.getvalue().splitlines()[:2] == [
+            "id,name,location,employee_count", f"{payroll.id},Payroll,\"Building A, 5th Floor\",1"])
+        assert (repr(payroll) == f"<Department {payroll.id}: Payroll, Building A, 5th Floor>")
+
+    def test_backfill_employee_counts(self):
+        '''contains method "backfill_employee_counts()" that adds and fills the column in an older database.'''
+        from models.employee import Employee
+        CURSOR.execute("DROP TABLE IF EXISTS employees")
+        CURSOR.execute("CREATE TABLE departments (id INTEGER PRIMARY KEY, name TEXT, location TEXT)")
+        CURSOR.execute("CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, job_title TEXT, department_id INTEGER, FOREIGN KEY (department_id) REFERENCES departments(id))")
+        CURSOR.execute("INSERT INTO departments (name, location) VALUES ('Payroll', 'Building A')")
+        CURSOR.executemany("INSERT INTO employees (name, job_title, department_id) VALUES (?, 'Clerk', 1)",
+                           [("Amir",), ("Bola",)])
+
+        assert (Department.backfill_employee_counts() == 1)
+        assert (Department.find_by_id(1).employee_count == 2)
+        assert (Employee.find_by_id(1).version == 1)
+
+        # counts are maintained from then on
+        Employee.create("Chen", "Clerk", 1)
+        assert (Department.find_by_id(1).employee_count == 3)
+
+    def test_upgrades_on_first_connection(self, monkeypatch):
+        '''reads a database created before the version and employee_count columns without create_table().'''
+        import models.__init__
+        import threading
+        from models.employee import Employee
+        CURSOR.execute("DROP TABLE IF EXISTS employees")
+        CURSOR.execute("CREATE TABLE departments (id INTEGER PRIMARY KEY, name TEXT, location TEXT)")
+        CURSOR.execute("CREATE TABLE employees (id INTEGER PRIMARY KEY, name TEXT, job_title TEXT, department_id INTEGER, FOREIGN KEY (department_id) REFERENCES departments(id))")
+        CURSOR.execute("INSERT INTO departments (name, location) VALUES ('Payroll', 'Building A')")
+        CURSOR.executemany("INSERT INTO employees (name, job_title, department_id) VALUES (?, 'Clerk', 1)",
+                           [("Amir",), ("Bola",)])
+        CURSOR.connection.commit()
+        # as if the database were opened by a new process
+        monkeypatch.setattr(models.__init__, "_UPGRADED", set())
+        results = []
+
+        def read():
+            department = Department.get_all()[0]
+            results.append((department.employee_count, Employee.find_by_id(1).version))
+            Employee.create("Chen", "Clerk", 1)
+            results.append(Department.find_by_id(1).employee_count)
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        assert (results == [(2, 1), 3])
+
+    def test_delete_cascades(self):
+        '''contains a method "delete()" that deletes the department's employees in the same transaction.'''
+        from models.employee import Employee
+        CURSOR.execute("DROP TABLE IF EXISTS employees")
+        Department.create_table()
+        Employee.create_table()
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        hr = Department.create("Human Resources", "Building C, East Wing")
+        amir = Employee.create("Amir", "Accountant", payroll.id)
+        Employee.create("Bola", "Manager", payroll.id)
+        chen = Employee.create("Chen", "Recruiter", hr.id)
+        saved = Employee.all
+
+        payroll.delete()
+
+        rows = CURSOR.execute("SELECT id FROM employees").fetchall()
+        assert (rows == [(chen.id,)])
+        assert (Employee.all == {chen.id: chen})
+        assert (amir.id not in Employee.all)
+        # the dictionary is changed in place, not replaced
+        assert (Employee.all is saved)
+
+        # the schema cascades deletes made outside the model too
+        CURSOR.execute("DELETE FROM departments WHERE id = ?", (hr.id,))
+        assert (CURSOR.execute("SELECT COUNT(*) FROM employees").fetchone()[0] == 0)
+
+    def test_delete_reassigns(self):
+        '''contains a method "delete()" that can move the department's employees to another department.'''
+        from models.employee import Employee
+        CURSOR.execute("DROP TABLE IF EXISTS employees")
+        Department.create_table()
+        Employee.create_table()
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        hr = Department.create("Human Resources", "Building C, East Wing")
+        amir = Employee.create("Amir", "Accountant", payroll.id)
+
+        with pytest.raises(ValueError):
+            payroll.delete(cascade=False)
+        assert (Department.find_by_id(payroll.id) is payroll)
+
+        payroll.delete(cascade=hr)
+
+        assert (Employee.all == {})
+        employee = Employee.find_by_id(amir.id)
+        assert ((employee.department_id, employee.version) == (hr.id, 2))
+        assert (Department.find_by_id(hr.id).employee_count == 1)
+        assert (Department.find_by_id(payroll.id) is None)
+
+    def test_upsert_many(self):
+        '''contains method "upsert_many()" that inserts new rows and updates changed ones by name.'''
+        Department.create_table()
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        Department.create("Human Resources", "Building C, East Wing")
+
+        result = Department.upsert_many([
+            ("Payroll", "Building B"),
+            ("Human Resources", "Building C, East Wing"),
+            ("Sales", "Building D"),
+        ])
+
+        assert (result == (1, 1, 1))
+        assert ((payroll.location, payroll.version) == ("Building B", 2))
+        sales = Department.find_by_name("Sales")
+        assert (Department.all[sales.id] is sales)
+        assert (CURSOR.execute("SELECT COUNT(*) FROM departments").fetchone()[0] == 3)
+
+        # running the same sync again changes nothing
+        assert (Department.upsert_many([("Payroll", "Building B")]) == (0, 0, 1))
+
+        # records are checked like the values given to create(), and the name
+        # is not a constraint of the table
+        for record in [("Payroll", None), ("Payroll", ""), (None, "Building B")]:
+            with pytest.raises(ValueError):
+                Department.upsert_many([record])
+        Department.create("Payroll", "Building E")
+        assert (len(Department.where(name="Payroll").all()) == 2)
@@ -0,0 +1,66 @@
+from models.__init__ import CONN, CURSOR
+from models.department import Department
+from models.employee import Employee
+import pytest
+
+np = pytest.importorskip("numpy")
+from models.employee_frame import EmployeeFrame  # noqa: E402
+
+
+class TestEmployeeFrame:
+    '''Class EmployeeFrame in employee_frame.py'''
+
+    @pytest.fixture(autouse=True)
+    def create_tables(self):
+        '''create tables with sample rows prior to each test.'''
+        Department.create_table()
+        Employee.create_table()
+
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        human_resources = Department.create("Human Resources", "Building C, East Wing")
+        Employee.create("Amir", "Accountant", payroll.id)
+        Employee.create("Bola", "Manager", payroll.id)
+        Employee.create("Charlie", "Manager", human_resources.id)
+        Employee.create("Dani", "Benefits Coordinator", human_resources.id)
+        Employee.create("Hao", "New Hires Coordinator", human_resources.id)
+
+    def test_loads_columns(self):
+        '''loads the table in chunks into array columns with encoded job titles.'''
+        frame = EmployeeFrame.load(chunk_size=2)
+        assert (len(frame) == 5)
+        assert (frame.ids.tolist() == [1, 2, 3, 4, 5])
+        assert (frame.department_ids.dtype == np.int64)
+        assert (len(frame.titles) == 4)
+        assert (frame.job_titles.tolist() == [
+            "Accountant", "Manager", "Manager",
+            "Benefits Coordinator", "New Hires Coordinator"])
+
+    def test_filters(self):
+        '''filters by department and job title without creating objects.'''
+        Employee.all = {}
+        frame = EmployeeFrame.load()
+        assert (frame.in_department(2).names.tolist() == ["Charlie", "Dani", "Hao"])
+        assert (len(frame.in_department(1, 2)) == 5)
+        assert (frame.with_job_title("Manager").ids.tolist() == [2, 3])
+        assert (len(frame.with_job_title("Chef")) == 0)
+        assert (Employee.all == {})
+
+    def test_group_by(self):
+        '''counts employees per department and per job title.'''
+        frame = EmployeeFrame.load()
+        assert (frame.count_by_department() == {1: 2, 2: 3})
+        assert (frame.in_department(1).count_by_job_title() ==
+                {"Accountant": 1, "Manager": 1})
+
+    def test_join_departments(self):
+        '''joins each row to its department's name and location.'''
+        # a row left dangling before foreign keys were enforced
+        CURSOR.execute("PRAGMA foreign_keys = OFF")
+        CURSOR.execute(
+            "INSERT INTO employees (name, job_title, department_id) VALUES ('Eve', 'Intern', 9)")
+        CONN.commit()
+        CURSOR.execute("PRAGMA foreign_keys = ON")
+        names, locations = EmployeeFrame.load().join_departments()
+        assert (names.tolist() == ["Payroll", "Payroll", "Human Resources",
+                                   "Human Resources", "Human Resources", None])
+        assert (locations[0] == "Building A, 5th Floor")
@@ -1,8 +1,10 @@
-from models.__init__ import CONN, CURSOR
+from models.__init__ import CURSOR, StaleObjectError, set_trace_callback
 from models.employee import Employee
 from models.department import Department
+from models.model import VALUE_POOL
 from faker import Faker
 import pytest
+import sqlite3
 
 
 class TestEmployee:
@@ -24,6 +26,9 @@ class TestEmployee:
         Department.create_table()  # ensure Department table exists due to FK constraint
         Employee.create_table()
         assert (CURSOR.execute("SELECT * FROM employees"))
+        plan = CURSOR.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM employees WHERE department_id = 1").fetchall()
+        assert ("employees_department_id" in plan[0][-1])
 
     def test_drops_table(self):
         '''contains method "drop_table()" that drops table "employees" if it exists.'''
@@ -167,6 +172,22 @@ class TestEmployee:
                 (employee2.id, employee2.name, employee2.job_title, employee2.department_id) ==
                 (id2, "Tal", "Benefits Coordinator", department.id))
 
+    def test_delete_keeps_reused_id(self):
+        '''contains a method "delete()" that leaves the dictionary entry of another object with the same id.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        Employee.create_table()
+        employee = Employee.create("Raha", "Accountant", department.id)
+
+        # another thread deleted the row, and a new one took its id
+        CURSOR.execute("DELETE FROM employees")
+        CURSOR.connection.commit()
+        newer = Employee.create("Tal", "Benefits Coordinator", department.id)
+        assert (newer.id == employee.id)
+
+        employee.delete()
+        assert (Employee.all[newer.id] is newer)
+
     def test_instance_from_db(self):
         '''contains method "instance_from_db()" that takes a db row and creates an Employee instance.'''
 
@@ -265,3 +286,135 @@ class TestEmployee:
 
         employee = Employee.find_by_id(3)
         assert (employee is None)
+
+    def test_instance_from_db_trusts_row(self):
+        '''hydrates rows without validating setters or department lookups.'''
+
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        Employee.create_table()
+        employee1 = Employee.create("Amir", "Accountant", department.id)
+        employee1.name = "Amir Lee"  # local change not persisted
+
+        statements = []
+        set_trace_callback(statements.append)
+        try:
+            employees = [Employee.instance_from_db(row) for row in
+                         [(employee1.id, "Amir", "Accountant", department.id, 1),
+                          (7, "Bola", "Manager", department.id, 1)]]
+        finally:
+            set_trace_callback(None)
+
+        assert (statements == [])
+        # cached instance is reset to the row values
+        assert (employees[0] is employee1)
+        assert (employee1.name == "Amir")
+        assert (Employee.all[7] is employees[1])
+        assert ((employees[1].id, employees[1].name, employees[1].job_title, employees[1].department_id) ==
+                (7, "Bola", "Manager", department.id))
+
+    def test_update_detects_conflict(self):
+        '''contains a method "update()" that raises StaleObjectError when the row was deleted since it was read.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        Employee.create_table()
+        employee = Employee.create("Raha", "Accountant", department.id)
+        CURSOR.execute("DELETE FROM employees")
+
+        employee.job_title = "Senior Accountant"
+        with pytest.raises(StaleObjectError):
+            employee.update()
+        with pytest.raises(StaleObjectError):
+            employee.refresh()
+
+    def test_department_loads_departments_together(self):
+        '''contains a property "department" that loads the departments of employees read together in one query.'''
+        Department.create_table()
+        departments = [Department.create(f"Department {n}", "Building A") for n in range(3)]
+        Employee.create_table()
+        for n in range(6):
+            Employee.create(f"Employee {n}", "Clerk", departments[n % 3].id)
+        Department.all = {}
+        Employee.all = {}
+
+        statements = []
+        set_trace_callback(statements.append)
+        try:
+            roster = [(employee.name, employee.department.name)
+                      for employee in Employee.get_all()]
+        finally:
+            set_trace_callback(None)
+
+        assert (len(statements) == 2)
+        assert (roster == [(f"Employee {n}", f"Department {n % 3}") for n in range(6)])
+
+        # loaded departments are reused without a query
+        employee = Employee.find_by_id(1)
+        statements = []
+        set_trace_callback(statements.append)
+        try:
+            assert (employee.department is Department.all[departments[0].id])
+        finally:
+            set_trace_callback(None)
+        assert (statements == [])
+
+    def test_instance_from_db_pools_job_titles(self):
+        '''shares one copy of each job title between hydrated objects, up to the pool's limit.'''
+        title = "".join(["Account", "ant"])
+        rows = [(id_, "Amir", "".join(["Account", "ant"]), 1, 1) for id_ in (1, 2)]
+        VALUE_POOL.clear()
+        VALUE_POOL[title] = title
+
+        employees = [Employee.instance_from_db(row) for row in rows]
+        assert (employees[0].job_title is title)
+        assert (employees[1].job_title is title)
+
+        VALUE_POOL.clear()
+        limit, VALUE_POOL.limit = VALUE_POOL.limit, 0
+        try:
+            employee = Employee.instance_from_db((3, "Bola", "Manager", 1, 1))
+        finally:
+            VALUE_POOL.limit = limit
+        assert (employee.job_title == "Manager")
+        assert (len(VALUE_POOL) == 0)
+
+    def test_upsert_many(self):
+        '''contains method "upsert_many()" that matches rows on name and department.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        Employee.create_table()
+        amir = Employee.create("Amir", "Accountant", department.id)
+        records = [("Amir", "Senior Accountant", department.id),
+                   ("Bola", "Manager", department.id)]
+
+        assert (Employee.upsert_many(records) == (1, 1, 0))
+        assert (Employee.upsert_many(records) == (0, 0, 2))
+        assert (amir.job_title == "Senior Accountant")
+        assert (sorted(employee.name for employee in Employee.all.values()) == ["Amir", "Bola"])
+        assert (Department.find_by_id(department.id).employee_count == 2)
+
+        # records are checked like the values given to create()
+        for record in [("Chen", "Clerk", 99), ("Chen", "Clerk", None), ("Chen", "", department.id)]:
+            with pytest.raises(ValueError):
+                Employee.upsert_many([record])
+        assert (len(Employee.get_all()) == 2)
+
+        # the key is not a constraint of the table
+        Employee.create("Bola", "Clerk", department.id)
+        assert (Employee.upsert_many([("Bola", "Manager", department.id)]) == (0, 0, 1))
+        assert (Employee.upsert_many([("Amir", "Clerk", department.id)], key=["name"]) == (0, 1, 0))
+        assert (amir.job_title == "Clerk")
+
+    @pytest.mark.skipif(not hasattr(sqlite3.Connection, "setlimit"),
+                        reason="Connection.setlimit() needs Python 3.11")
+    def test_upsert_many_variable_limit(self):
+        '''contains method "upsert_many()" that binds fewer than 999 parameters per statement.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        Employee.create_table()
+        limit = CURSOR.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        try:
+            records = [(f"Employee {n}", "Clerk", department.id) for n in range(600)]
+            assert (Employee.upsert_many(records) == (600, 0, 0))
+        finally:
+            CURSOR.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
@@ -0,0 +1,65 @@
+from models.department import Department
+from models.employee import Employee
+from listing import write_listing
+import io
+import json
+import pytest
+
+
+class TestListing:
+    '''Function write_listing in listing.py'''
+
+    @pytest.fixture(autouse=True)
+    def create_tables(self):
+        '''create tables with sample rows prior to each test.'''
+        Department.create_table()
+        Employee.create_table()
+
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        Employee.create("Amir", "Accountant", department.id)
+        Employee.create("Bola", "Manager", department.id)
+
+    def listing(self, fmt):
+        out = io.StringIO()
+        write_listing(Employee, Employee.iter_rows(), fmt, out)
+        return out.getvalue().splitlines()
+
+    def test_repr_format(self):
+        '''writes one repr line per row, matching the model's repr.'''
+        assert (self.listing("repr") ==
+                [repr(employee) for employee in Employee.get_all()])
+
+    def test_csv_format(self):
+        '''writes a header and one csv line per row.'''
+        assert (self.listing("csv") == [
+            "id,name,job_title,department_id",
+            "1,Amir,Accountant,1",
+            "2,Bola,Manager,1",
+        ])
+
+    def test_jsonl_format(self):
+        '''writes one json object per row.'''
+        lines = self.listing("jsonl")
+        assert (json.loads(lines[1]) ==
+                {"id": 2, "name": "Bola", "job_title": "Manager", "department_id": 1})
+
+    def test_table_format(self):
+        '''writes aligned columns under a header.'''
+        lines = self.listing("table")
+        assert (lines[0].split() == list(Employee.COLUMNS))
+        assert (lines[2].split() == ["1", "Amir", "Accountant", "1"])
+        assert (len(lines) == 4)
+
+    def test_department_employees(self):
+        '''streams only the employees of a department.'''
+        department = Department.create("Human Resources", "Building C")
+        Employee.create("Dani", "Benefits Coordinator", department.id)
+        out = io.StringIO()
+        write_listing(Employee, department.employee_rows(), "csv", out)
+        assert (out.getvalue().splitlines()[1:] ==
+                ["3,Dani,Benefits Coordinator,2"])
+
+    def test_unknown_format(self):
+        '''rejects unknown formats.'''
+        with pytest.raises(ValueError):
+            write_listing(Employee, [], "xml", io.StringIO())
@@ -0,0 +1,39 @@
+from load_generator import percentile, report, run, seed_database
+from models.department import Department
+from models.employee import Employee
+import io
+
+
+class TestLoadGenerator:
+    '''Load generator in load_generator.py'''
+
+    def test_seed_database(self):
+        '''replaces the database contents with the requested number of rows.'''
+        seed_database(3, 20)
+        assert (len(Department.get_all()) == 3)
+        assert (Department.find_by_id(1).employee_count == 7)
+        assert (Employee.where(department_id=3).count() == 6)
+
+    def test_run_and_report(self):
+        '''runs reads and writes from concurrent workers and reports each action.'''
+        seed_database(5, 50)
+        results = run(workers=3, duration=0.3, writes=0.5, seed=1)
+
+        latencies = results["latencies"]
+        assert ({"create_employee", "find_employee_by_id"} <= set(latencies))
+        assert (results["errors"]["other errors"] == 0)
+        assert (results["statements"]["find_employee_by_id"] ==
+                len(latencies["find_employee_by_id"]))
+
+        out = io.StringIO()
+        report(results, 0.3, 3, out)
+        lines = out.getvalue().splitlines()
+        assert (lines[0].startswith(f"{sum(map(len, latencies.values()))} actions by 3 workers"))
+        assert (lines[1].endswith("0 other errors"))
+        assert (len(lines) == 3 + len(latencies))
+
+    def test_percentile(self):
+        '''returns the nearest-rank percentile.'''
+        values = list(range(1, 101))
+        assert ((percentile(values, 50), percentile(values, 99), percentile([7], 95)) ==
+                (50, 99, 7))
@@ -0,0 +1,77 @@
+from models.__init__ import CURSOR
+from models.model import Model
+import pytest
+
+
+class Office(Model):
+    '''A model declared only through its table and fields.'''
+
+    TABLE = "offices"
+    FIELDS = (("building", "TEXT"), ("floor", "INTEGER"))
+    ROW_FORMAT = "<Office {}: {}, floor {}>"
+
+    def __init__(self, building, floor):
+        self.id = None
+        self.version = None
+        self.building = building
+        self.floor = floor
+
+
+class Room(Model):
+    '''A model without a ROW_FORMAT.'''
+
+    TABLE = "rooms"
+    FIELDS = (("name", "TEXT"), ("seats", "INTEGER"))
+
+    def __init__(self, name, seats):
+        self.id = None
+        self.version = None
+        self.name = name
+        self.seats = seats
+
+
+class TestModel:
+    '''Class Model in model.py'''
+
+    @pytest.fixture(autouse=True)
+    def reset_table(self):
+        '''drop and recreate the table prior to each test.'''
+        Office.drop_table()
+        Office.create_table()
+        Office.all = {}
+
+    def test_declares_columns(self):
+        '''derives the column names and the table schema from FIELDS.'''
+        assert (Office.COLUMNS == ("id", "building", "floor"))
+        columns = [row[1] for row in CURSOR.execute("PRAGMA table_info(offices)")]
+        assert (columns == ["id", "building", "floor", "version"])
+
+    def test_generated_methods(self):
+        '''generates the ORM methods for a new model.'''
+        office = Office.create("Building A", 5)
+        assert (office.values() == ("Building A", 5))
+        assert (repr(office) == f"<Office {office.id}: Building A, floor 5>")
+
+        office.floor = 6
+        office.update()
+        Office.all = {}
+        found = Office.find_by_id(office.id)
+        assert (found is not office)
+        assert ((found.id, found.building, found.floor, found.version) ==
+                (office.id, "Building A", 6, 2))
+        assert (Office.get_all() == [found])
+
+        found.delete()
+        assert (Office.find_by_id(office.id) is None)
+
+    def test_separate_identity_maps(self):
+        '''gives each model its own dictionary of saved objects.'''
+        from models.department import Department
+        from models.employee import Employee
+        assert (len({id(Office.all), id(Department.all), id(Employee.all)}) == 3)
+
+    def test_default_row_format(self):
+        '''formats a model without a ROW_FORMAT from its columns.'''
+        Room.create_table()
+        room = Room.create(name="Boardroom", seats=12)
+        assert (repr(room) == f"<Room {room.id}: Boardroom, 12>")
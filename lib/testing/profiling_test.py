@@ -0,0 +1,44 @@
+from models.department import Department
+from profiling import profiled
+import io
+import os
+import pstats
+
+
+class TestProfiling:
+    '''Function profiled in profiling.py'''
+
+    def test_profiles_action(self, tmp_path):
+        '''writes a stats file and prints wall time, query count and top functions.'''
+        Department.create_table()
+        out = io.StringIO()
+        with profiled("create", str(tmp_path), out=out):
+            Department.create("Payroll", "Building A, 5th Floor")
+            Department.find_by_name("Payroll")
+
+        files = os.listdir(tmp_path)
+        assert (len(files) == 1 and files[0].startswith("create-"))
+        assert (pstats.Stats(str(tmp_path / files[0])).total_calls > 0)
+        summary = out.getvalue().splitlines()
+        # INSERT and SELECT
+        assert ("2 SQL statements" in summary[0])
+        assert (any("save" in line for line in summary[1:]))
+
+    def test_counts_repeated_statements(self, tmp_path):
+        '''counts every statement run, including repeats of the same one.'''
+        Department.create_table()
+        department = Department.create("Payroll", "Building A, 5th Floor")
+        out = io.StringIO()
+        with profiled("find", str(tmp_path), out=out):
+            for _ in range(5):
+                Department.find_by_id(department.id)
+        assert ("5 SQL statements" in out.getvalue().splitlines()[0])
+
+    def test_disabled(self, tmp_path, monkeypatch):
+        '''runs the block unprofiled when no directory is configured.'''
+        import profiling
+        monkeypatch.setattr(profiling, "PROFILE_DIR", None)
+        out = io.StringIO()
+        with profiled("create", out=out):
+            pass
+        assert (out.getvalue() == "")
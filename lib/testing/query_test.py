@@ -0,0 +1,63 @@
+from models.__init__ import set_trace_callback
+from models.department import Department
+from models.employee import Employee
+import pytest
+
+
+class TestQuery:
+    '''Class Query in query.py'''
+
+    @pytest.fixture(autouse=True)
+    def seed(self):
+        '''create two departments with five employees prior to each test.'''
+        Department.create_table()
+        Employee.create_table()
+        payroll = Department.create("Payroll", "Building A, 5th Floor")
+        human_resources = Department.create("Human Resources", "Building C, East Wing")
+        Employee.create("Amir", "Accountant", payroll.id)
+        Employee.create("Bola", "Manager", payroll.id)
+        Employee.create("Charlie", "Manager", human_resources.id)
+        Employee.create("Dani", "Benefits Coordinator", human_resources.id)
+        Employee.create("Hao", "New Hires Coordinator", human_resources.id)
+
+    def run(self, call):
+        statements = []
+        set_trace_callback(statements.append)
+        try:
+            return call(), statements
+        finally:
+            set_trace_callback(None)
+
+    def test_is_lazy(self):
+        '''reads nothing until the query is used, then runs one statement.'''
+        query, statements = self.run(
+            lambda: Employee.where(job_title="Manager").order_by("-name").limit(5))
+        assert (statements == [])
+
+        employees, statements = self.run(query.all)
+        assert ([employee.name for employee in employees] == ["Charlie", "Bola"])
+        assert (len(statements) == 1)
+        assert (employees[0] is Employee.all[employees[0].id])
+
+    def test_conditions(self):
+        '''matches equal values, any value of a list, and NULL for None.'''
+        assert ([employee.name for employee in
+                 Employee.where(department_id=2, job_title=["Manager", "Dani"]).order_by("id")] ==
+                ["Charlie"])
+        assert (Employee.where(name=["Amir", "Hao"]).count() == 2)
+        assert (not Employee.where(job_title=None).exists())
+        assert (Employee.where(department_id=1).where(name="Bola").first().job_title == "Manager")
+        assert (Employee.where(name="Zed").first() is None)
+
+    def test_count_respects_limit(self):
+        '''counts and checks for rows without loading objects.'''
+        assert (Employee.order_by("name").limit(3).count() == 3)
+        assert (Employee.where(department_id=2).count() == 3)
+        assert (Department.where(location="Building C, East Wing").exists())
+
+    def test_rejects_unknown_columns(self):
+        '''raises ValueError for a column the model does not have.'''
+        with pytest.raises(ValueError):
+            Employee.where(salary=10)
+        with pytest.raises(ValueError):
+            Employee.order_by("name; DROP TABLE employees")
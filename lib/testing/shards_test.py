@@ -0,0 +1,252 @@
+from models.department import Department
+from models.employee import Employee
+from models import shards
+import models.__init__
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+
+
+def run_in_thread(test):
+    '''run test in a new thread, which opens its own (sharded) connection.'''
+    errors = []
+
+    def run():
+        try:
+            test()
+        except BaseException as exc:
+            errors.append(exc)
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+class TestShards:
+    '''Sharded employee storage in shards.py'''
+
+    @pytest.fixture(autouse=True)
+    def sharded_db(self, tmp_path, monkeypatch):
+        '''use a new database with three employee shards.'''
+        monkeypatch.setattr(models.__init__, "DATABASE", str(tmp_path / "company.db"))
+        monkeypatch.setattr(shards, "SHARDS", 3)
+        Department.all = {}
+        Employee.all = {}
+        self.tmp_path = tmp_path
+
+    def test_places_rows_by_department(self):
+        '''stores each employee in the shard of its department, with unique ids.'''
+        def test():
+            Department.create_table()
+            Employee.create_table()
+            departments = [Department.create(f"Department {i}", "Building A")
+                           for i in range(3)]
+            employees = [Employee.create(f"Employee {i}", "Manager", departments[i % 3].id)
+                         for i in range(9)]
+
+            assert (len({employee.id for employee in employees}) == 9)
+            for department in departments:
+                count = models.__init__.CURSOR.execute(
+                    f"SELECT COUNT(*) FROM {Employee.table_for(department.id)}").fetchone()[0]
+                assert (count == 3)
+                assert (len(department.employees()) == 3)
+            for shard in range(3):
+                assert (models.__init__.CURSOR.execute(
+                    f"SELECT 1 FROM shard{shard}.sqlite_master "
+                    "WHERE name = 'employees_department_id'").fetchone())
+
+            Employee.all = {}
+            assert (len(Employee.get_all()) == 9)
+            assert (Employee.find_by_id(employees[4].id).name == "Employee 4")
+            assert (Employee.find_by_name("Employee 7").id == employees[7].id)
+        run_in_thread(test)
+        assert (sorted(name for name in os.listdir(self.tmp_path) if name.endswith(".db")) == [
+            "company-employees-0.db", "company-employees-1.db",
+            "company-employees-2.db", "company.db"])
+
+    def test_moves_between_shards(self):
+        '''moves an employee to another shard when its department changes.'''
+        def test():
+            Department.create_table()
+            Employee.create_table()
+            payroll = Department.create("Payroll", "Building A")
+            sales = Department.create("Sales", "Building B")
+            employee = Employee.create("Amir", "Accountant", payroll.id)
+            id_ = employee.id
+
+            employee.department_id = sales.id
+            employee.update()
+
+            assert ((employee.id, employee.version) == (id_, 2))
+            assert (payroll.employees() == [])
+            assert (sales.employees() == [employee])
+
+            # the id is not reused by the shard the employee left
+            other = Employee.create("Bola", "Manager", payroll.id)
+            assert (other.id != id_)
+
+            employee.delete()
+            Employee.all = {}
+            assert ([employee.id for employee in Employee.get_all()] == [other.id])
+        run_in_thread(test)
+
+    def test_maintains_employee_counts(self):
+        '''keeps departments.employee_count up to date without triggers.'''
+        def test():
+            Department.create_table()
+            Employee.create_table()
+            payroll = Department.create("Payroll", "Building A")
+            sales = Department.create("Sales", "Building B")
+            amir = Employee.create("Amir", "Accountant", payroll.id)
+            Employee.create("Bola", "Manager", payroll.id)
+
+            amir.department_id = sales.id
+            amir.update()
+            Employee.create("Chen", "Clerk", sales.id).delete()
+
+            counts = models.__init__.CURSOR.execute(
+                "SELECT id, employee_count FROM departments ORDER BY id").fetchall()
+            assert (counts == [(payroll.id, 1), (sales.id, 1)])
+        run_in_thread(test)
+
+    def test_deletes_department_employees(self):
+        '''deletes or moves a deleted department's employees within and across shards.'''
+        def test():
+            Department.create_table()
+            Employee.create_table()
+            departments = [Department.create(f"Department {i}", "Building A") for i in range(5)]
+            for department in departments[:3]:
+                Employee.create("Amir", "Accountant", department.id)
+                Employee.create("Bola", "Manager", department.id)
+
+            departments[0].delete()
+            departments[1].delete(cascade=departments[4])  # same shard
+            departments[2].delete(cascade=departments[3])  # another shard
+
+            assert (Employee.all == {})
+            counts = models.__init__.CURSOR.execute(
+                "SELECT id, employee_count FROM departments ORDER BY id").fetchall()
+            assert (counts == [(departments[3].id, 2), (departments[4].id, 2)])
+            assert ([len(department.employees()) for department in departments[3:]] == [2, 2])
+        run_in_thread(test)
+
+    def test_upsert_many(self):
+        '''upserts employees into the shards of their departments.'''
+        def test():
+            Department.create_table()
+            Employee.create_table()
+            payroll = Department.create("Payroll", "Building A")
+            sales = Department.create("Sales", "Building B")
+            amir = Employee.create("Amir", "Accountant", payroll.id)
+
+            result = Employee.upsert_many([
+                ("Amir", "Senior Accountant", payroll.id),
+                ("Bola", "Manager", payroll.id),
+                ("Chen", "Clerk", sales.id),
+            ])
+
+            assert (result == (2, 1, 0))
+            assert ((amir.job_title, amir.version) == ("Senior Accountant", 2))
+            assert (len({employee.id for employee in Employee.get_all()}) == 3)
+            assert ([employee.name for employee in sales.employees()] == ["Chen"])
+            counts = models.__init__.CURSOR.execute(
+                "SELECT employee_count FROM departments ORDER BY id").fetchall()
+            assert (counts == [(2,), (1,)])
+
+            # an update on another key could move an employee between shards
+            with pytest.raises(ValueError):
+                Employee.upsert_many([("Amir", "Manager", sales.id)], key=["name"])
+        run_in_thread(test)
+
+    def test_snapshot(self):
+        '''snapshots, vacuums and restores the shards along with the main database.'''
+        from models.snapshot import snapshot, restore, vacuum_into
+
+        def test():
+            Department.create_table()
+            Employee.create_table()
+            departments = [Department.create(f"Department {i}", "Building A")
+                           for i in range(3)]
+            for i in range(6):
+                Employee.create(f"Employee {i}", "Manager", departments[i % 3].id)
+            (self.tmp_path / "backups").mkdir()
+            target = str(self.tmp_path / "backups" / "snapshot.db")
+            snapshot(target)
+            vacuum_into(str(self.tmp_path / "backups" / "vacuumed.db"))
+
+            for department in departments:
+                department.delete()
+            restore(target)
+
+            counts = models.__init__.CURSOR.execute(
+                "SELECT employee_count FROM departments ORDER BY id").fetchall()
+            assert (counts == [(2,), (2,), (2,)])
+            assert (models.__init__.CURSOR.execute(
+                "SELECT COUNT(*) FROM employees").fetchone()[0] == 6)
+        run_in_thread(test)
+        assert (sorted(os.listdir(self.tmp_path / "backups")) == [
+            "snapshot-employees-0.db", "snapshot-employees-1.db", "snapshot-employees-2.db",
+            "snapshot.db", "vacuumed-employees-0.db", "vacuumed-employees-1.db",
+            "vacuumed-employees-2.db", "vacuumed.db"])
+
+    def test_writers_to_different_shards(self):
+        '''lets a writer to one shard commit while another shard's transaction is open.'''
+        departments = []
+
+        def setup():
+            Department.create_table()
+            Employee.create_table()
+            departments.extend(Department.create(f"Department {i}", "Building A")
+                               for i in range(2))
+        run_in_thread(setup)
+
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            with models.__init__.CONN.transaction():
+                Employee.create("Amir", "Accountant", departments[1].id)
+                holding.set()
+                release.wait(5)
+        holder = threading.Thread(target=hold)
+        holder.start()
+        holding.wait(5)
+        elapsed = []
+
+        def write():
+            start = time.perf_counter()
+            Employee.create("Bola", "Manager", departments[0].id)
+            elapsed.append(time.perf_counter() - start)
+        try:
+            run_in_thread(write)
+        finally:
+            release.set()
+            holder.join()
+        assert (elapsed[0] < 0.5)
+
+        def counts():
+            assert (models.__init__.CURSOR.execute(
+                "SELECT employee_count FROM departments ORDER BY id").fetchall() == [(1,), (1,)])
+        run_in_thread(counts)
+
+    def test_journal_modes(self):
+        '''keeps the main database in WAL mode and the shards in rollback journal mode.'''
+        def test():
+            conn = models.__init__.CONN
+            assert (conn.execute("PRAGMA main.journal_mode").fetchone()[0] == "wal")
+            assert ([conn.execute(f"PRAGMA shard{shard}.journal_mode").fetchone()[0]
+                     for shard in range(3)] == ["delete"] * 3)
+        run_in_thread(test)
+
+    def test_rejects_too_many_shards(self):
+        '''refuses more shards than SQLite can attach to a connection.'''
+        result = subprocess.run(
+            [sys.executable, "-c", "import models.shards"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=dict(os.environ, COMPANY_DB_SHARDS=str(shards.MAX_SHARDS + 1)),
+            capture_output=True, text=True)
+        assert (result.returncode != 0)
+        assert ("COMPANY_DB_SHARDS must be from 0 to 10, not 11" in result.stderr)
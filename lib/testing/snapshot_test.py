@@ -0,0 +1,65 @@
+from models.__init__ import CURSOR
+from models.department import Department
+from models.snapshot import snapshot, restore, vacuum_into, MAX_RESTARTS
+import sqlite3
+import pytest
+
+
+class TestSnapshot:
+    '''Online snapshots in snapshot.py'''
+
+    @pytest.fixture(autouse=True)
+    def create_tables(self):
+        '''create tables with sample rows prior to each test.'''
+        Department.create_table()
+        for i in range(200):
+            Department.create(f"Department {i}", "Building A, " + "x" * 500)
+
+    def count(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM departments").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_snapshot(self, tmp_path):
+        '''copies the database in steps, reporting progress.'''
+        steps = []
+        target = str(tmp_path / "snapshot.db")
+        snapshot(target, pages=4, pause=0,
+                 progress=lambda remaining, total: steps.append(remaining))
+        assert (self.count(target) == 200)
+        assert (len(steps) > 1 and steps[-1] == 0)
+
+    def test_gives_up_restarting(self, tmp_path):
+        '''raises OperationalError once writes have restarted a stepped copy too often.'''
+        steps = []
+
+        def write(remaining, total):
+            steps.append(remaining)
+            Department.create("Sales", "Building B")
+        with pytest.raises(sqlite3.OperationalError):
+            snapshot(str(tmp_path / "snapshot.db"), pages=4, pause=0, progress=write)
+        assert (sum(1 for i in range(1, len(steps)) if steps[i] > steps[i - 1]) == MAX_RESTARTS)
+
+    def test_single_step_with_writes(self, tmp_path):
+        '''copies the database in one step by default, however often it is written to.'''
+        target = str(tmp_path / "snapshot.db")
+        snapshot(target, progress=lambda remaining, total: Department.create("Sales", "B"))
+        assert (self.count(target) == 200)
+
+    def test_vacuum_into(self, tmp_path):
+        '''writes a compacted copy of the database.'''
+        target = str(tmp_path / "vacuumed.db")
+        vacuum_into(target)
+        assert (self.count(target) == 200)
+
+    def test_restore(self, tmp_path):
+        '''restores the database from a snapshot.'''
+        target = str(tmp_path / "snapshot.db")
+        snapshot(target)
+        CURSOR.execute("DELETE FROM departments")
+        CURSOR.connection.commit()
+
+        restore(target)
+        assert (CURSOR.execute("SELECT COUNT(*) FROM departments").fetchone()[0] == 200)
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import time
+
+LIB = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds allowed between starting cli.py and showing the menu, interpreter
+# start-up included. Generous so slow CI machines don't fail spuriously.
+STARTUP_BUDGET = 0.5
+
+
+def run_cli():
+    '''run cli.py with closed stdin under -X importtime, return (seconds, imported modules).'''
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "cli.py"],
+        cwd=LIB, stdin=subprocess.DEVNULL, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    assert (result.returncode == 0)
+    modules = {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines() if line.startswith("import time:")
+    }
+    return elapsed, modules
+
+
+class TestStartup:
+    '''Start-up of cli.py'''
+
+    def test_defers_imports(self):
+        '''shows the menu without importing the helpers, models or sqlite3.'''
+        elapsed, modules = run_cli()
+        assert (not modules & {"helpers", "models", "models.department",
+                               "models.employee", "sqlite3", "listing"})
+
+    def test_startup_budget(self):
+        '''shows the menu within the start-up budget.'''
+        elapsed = min(run_cli()[0] for _ in range(3))
+        assert (elapsed < STARTUP_BUDGET)